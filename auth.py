@@ -0,0 +1,147 @@
+# backend/auth.py
+
+import asyncio
+import os
+import secrets
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import jwt
+from passlib.context import CryptContext
+
+from cache import LRUTTLCache
+
+# --- Password hashing ---
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt burns ~100-300ms of CPU per call (releasing the GIL), so it runs on a
+# small thread pool. At most HASH_WORKERS hashes run at once; callers that wait
+# longer than HASH_QUEUE_TIMEOUT seconds for a slot are turned away.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "4"))
+HASH_QUEUE_TIMEOUT = float(os.getenv("HASH_QUEUE_TIMEOUT", "5"))
+
+
+class HashingBusy(Exception):
+    pass
+
+
+class HashingPool:
+    def __init__(self, workers, queue_timeout):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+        self._slots = asyncio.Semaphore(workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def run(self, fn, *args):
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HashingBusy("Password hashing queue is full.")
+        finally:
+            self.waiting -= 1
+
+        queue_time = time.perf_counter() - queued_at
+        self.queue_time_total += queue_time
+        self.queue_time_max = max(self.queue_time_max, queue_time)
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        started = self.completed + self.in_flight
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_time_avg_ms": round(self.queue_time_total / started * 1000, 2) if started else 0.0,
+            "queue_time_max_ms": round(self.queue_time_max * 1000, 2),
+        }
+
+
+hashing_pool = HashingPool(HASH_WORKERS, HASH_QUEUE_TIMEOUT)
+
+
+# --- Password helpers ---
+def verify_password(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def hash_password(password):
+    return pwd_context.hash(password)
+
+
+async def verify_password_async(plain_password, hashed_password):
+    return await hashing_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def hash_password_async(password):
+    return await hashing_pool.run(hash_password, password)
+
+
+# --- Session tokens ---
+# Signed (HS256) and stateless: validating one is an HMAC check, not a bcrypt
+# verify or a DB round-trip. Revoked token ids are remembered until the token
+# would have expired anyway; SESSION_REVOCATION_DB shares them between workers.
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+SESSION_TTL = int(os.getenv("SESSION_TTL", "86400"))
+SESSION_ALGORITHM = "HS256"
+
+if not SESSION_SECRET:
+    print("⚠ SESSION_SECRET not set. Using a random key; sessions will not survive a restart or span workers.")
+    SESSION_SECRET = secrets.token_hex(32)
+
+revoked_sessions = LRUTTLCache(
+    maxsize=int(os.getenv("SESSION_REVOCATION_SIZE", "100000")),
+    ttl=SESSION_TTL,
+    db_path=os.getenv("SESSION_REVOCATION_DB") or None,
+    name="revoked_sessions",
+)
+
+
+class InvalidSession(Exception):
+    pass
+
+
+def create_session_token(user_id, username):
+    now = int(time.time())
+    payload = {
+        "sub": str(user_id),
+        "username": username,
+        "iat": now,
+        "exp": now + SESSION_TTL,
+        "jti": uuid.uuid4().hex,
+    }
+    return jwt.encode(payload, SESSION_SECRET, algorithm=SESSION_ALGORITHM)
+
+
+def decode_session_token(token):
+    try:
+        session = jwt.decode(token, SESSION_SECRET, algorithms=[SESSION_ALGORITHM])
+    except jwt.PyJWTError as e:
+        raise InvalidSession(str(e))
+    if revoked_sessions.get(session["jti"]):
+        raise InvalidSession("Session has been revoked.")
+    return session
+
+
+def revoke_session(session):
+    revoked_sessions.set(session["jti"], True)
@@ -0,0 +1,79 @@
+# benchmarks/bench_extraction.py
+#
+# Throughput and output quality of the scraper's text-extraction backends.
+# benchmarks/fixtures/ holds saved news pages (*.html): WordPress, AMP, a
+# legacy table layout, a Next.js page with inline JSON, and Tamil and Hindi
+# articles. They are rebuilt with original text so they can be redistributed.
+# Add your own saved pages there or pass --fixtures DIR; an empty directory
+# falls back to synthetic article pages.
+#
+#   python benchmarks/bench_extraction.py [--fixtures DIR] [--rounds N]
+
+import argparse
+import difflib
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from extraction import available_backends, extract_paragraph_text
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+REFERENCE_BACKEND = "bs4"
+WORDS = "government report claims officials said study vaccine election water percent according sources".split()
+
+
+def synthetic_page(rng):
+    nav = "".join(f'<li><a href="/s{i}">Section {i}</a></li>' for i in range(60))
+    body = "".join(
+        f"<p>{' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 80)))} <a href='#'>link</a>.</p>"
+        f"<div class='ad'><script>var slot{i} = {{}};</script></div>"
+        for i in range(rng.randint(15, 40))
+    )
+    return f"<html><head><style>p{{margin:0}}</style></head><body><ul>{nav}</ul><article>{body}</article></body></html>"
+
+
+def load_pages(fixtures):
+    pages = [p.read_text(encoding="utf-8", errors="replace") for p in sorted(Path(fixtures).glob("*.html"))]
+    if pages:
+        return pages, f"{len(pages)} fixture pages from {fixtures}"
+    rng = random.Random(42)
+    return [synthetic_page(rng) for _ in range(50)], "50 synthetic pages"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=2500)
+    args = parser.parse_args()
+
+    pages, description = load_pages(args.fixtures)
+    megabytes = sum(len(p.encode("utf-8")) for p in pages) / 1e6
+    backends = available_backends()
+    print(f"{description}, {megabytes:.1f} MB, {args.rounds} rounds, backends: {', '.join(backends)}")
+
+    reference = None
+    if REFERENCE_BACKEND in backends:
+        reference = [extract_paragraph_text(p, args.limit, REFERENCE_BACKEND) for p in pages]
+
+    print(f"{'backend':<12} {'pages/s':>10} {'MB/s':>8} {'similarity':>11}")
+    for backend in backends:
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            outputs = [extract_paragraph_text(p, args.limit, backend) for p in pages]
+        elapsed = time.perf_counter() - start
+        if reference:
+            similarity = sum(
+                difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(outputs, reference)
+            ) / len(pages)
+            quality = f"{similarity:11.4f}"
+        else:
+            quality = f"{'n/a':>11}"
+        print(f"{backend:<12} {len(pages) * args.rounds / elapsed:10.1f} "
+              f"{megabytes * args.rounds / elapsed:8.2f} {quality}")
+
+
+if __name__ == "__main__":
+    main()
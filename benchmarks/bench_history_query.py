@@ -0,0 +1,127 @@
+# benchmarks/bench_history_query.py
+#
+# Per-user chat-history query before and after
+# migrations/001_submission_history_index.sql, on a scratch copy of the
+# submission table filled with --rows rows (default 10M). Uses the DB_* settings
+# from .env and leaves the real submission table untouched.
+#
+#   python benchmarks/bench_history_query.py [--rows N] [--users N] [--keep]
+#
+# --keep leaves the table in place and reuses it on the next run.
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from dotenv import load_dotenv
+load_dotenv()
+
+from db import connect
+
+TABLE = "submission_history_bench"
+SEED_ROWS = 10000
+
+PREVIEW_QUERY = (
+    "SELECT id, LEFT(input_text, 120) AS preview FROM {table} {hint} "
+    "WHERE user_id = %s AND id < %s ORDER BY id DESC LIMIT 21"
+)
+COVERED_QUERY = (
+    "SELECT id, input_preview AS preview FROM {table} {hint} "
+    "WHERE user_id = %s AND id < %s ORDER BY id DESC LIMIT 21"
+)
+# (label, query, share of --queries to run; full scans are too slow for many samples)
+CASES = [
+    ("no index", PREVIEW_QUERY.format(table=TABLE, hint="IGNORE INDEX (idx_submission_user, idx_submission_user_history)"), 0.01),
+    ("user_id", PREVIEW_QUERY.format(table=TABLE, hint="FORCE INDEX (idx_submission_user)"), 1.0),
+    ("covering", COVERED_QUERY.format(table=TABLE, hint="FORCE INDEX (idx_submission_user_history)"), 1.0),
+]
+
+
+def build_table(cursor, conn, rows, users):
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute(f"""
+        CREATE TABLE {TABLE} (
+          id            BIGINT PRIMARY KEY AUTO_INCREMENT,
+          user_id       BIGINT NULL,
+          input_type    ENUM('text','image','audio') NOT NULL,
+          input_text    LONGTEXT NULL,
+          content_hash  CHAR(64) NOT NULL,
+          created_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+          input_preview VARCHAR(120) GENERATED ALWAYS AS (LEFT(input_text, 120)) STORED,
+          INDEX idx_submission_user (user_id),
+          INDEX idx_submission_user_history (user_id, id, input_preview)
+        ) ENGINE=InnoDB
+    """)
+    rng = random.Random(7)
+    words = "claim news report viral video minister vaccine election water flood says".split()
+    seed = [
+        (rng.randrange(users), "text", " ".join(rng.choice(words) for _ in range(rng.randint(40, 400))), "x" * 64)
+        for _ in range(SEED_ROWS)
+    ]
+    cursor.executemany(
+        f"INSERT INTO {TABLE} (user_id, input_type, input_text, content_hash) VALUES (%s, %s, %s, %s)", seed
+    )
+    conn.commit()
+    total = SEED_ROWS
+    while total < rows:
+        batch = min(total, rows - total)
+        cursor.execute(
+            f"INSERT INTO {TABLE} (user_id, input_type, input_text, content_hash) "
+            f"SELECT FLOOR(RAND() * %s), input_type, input_text, content_hash FROM {TABLE} LIMIT %s",
+            (users, batch)
+        )
+        conn.commit()
+        total += batch
+        print(f"  {total:,} rows")
+    cursor.execute(f"ANALYZE TABLE {TABLE}")
+    cursor.fetchall()
+
+
+def time_query(cursor, query, samples):
+    timings = []
+    for user_id, before_id in samples:
+        start = time.perf_counter()
+        cursor.execute(query, (user_id, before_id))
+        cursor.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[max(0, int(len(timings) * 0.99) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--keep", action="store_true", help="reuse an existing bench table")
+    args = parser.parse_args()
+
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute("SHOW TABLES LIKE %s", (TABLE,))
+    if not (args.keep and cursor.fetchall()):
+        print(f"building {TABLE} with {args.rows:,} rows...")
+        build_table(cursor, conn, args.rows, args.users)
+
+    cursor.execute(f"SELECT MAX(id) FROM {TABLE}")
+    max_id = cursor.fetchone()[0]
+    rng = random.Random(11)
+    samples = [(rng.randrange(args.users), rng.randrange(max_id // 2, max_id + 1)) for _ in range(args.queries)]
+
+    for label, query, share in CASES:
+        cursor.execute("EXPLAIN " + query, samples[0])
+        plan = cursor.fetchall()[0]
+        median, p99 = time_query(cursor, query, samples[:max(1, int(len(samples) * share))])
+        print(f"{label:<9} median {median:9.2f} ms   p99 {p99:9.2f} ms   plan: {plan}")
+
+    if not args.keep:
+        cursor.execute(f"DROP TABLE {TABLE}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# benchmarks/bench_search_client.py
+#
+# Per-query client overhead of search_the_web_google: building the Custom Search
+# service for every query (old behaviour) vs. reusing the long-lived service.
+#
+#   python benchmarks/bench_search_client.py            # offline, request construction only
+#   python benchmarks/bench_search_client.py --live 10  # also time real API calls (uses quota)
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from dotenv import load_dotenv
+load_dotenv()
+
+from googleapiclient.discovery import build
+import model
+
+
+def time_per_query(fn, n):
+    start = time.perf_counter()
+    for i in range(n):
+        fn(f"benchmark claim number {i}")
+    return (time.perf_counter() - start) / n * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=200, help="queries for the offline run")
+    parser.add_argument("--live", type=int, default=0, help="queries to execute against the real API")
+    args = parser.parse_args()
+
+    key = model.GOOGLE_API_KEY or "benchmark-key"
+    cx = model.SEARCH_ENGINE_ID or "benchmark-cx"
+    model.GOOGLE_API_KEY = key
+
+    def before(q):
+        service = build("customsearch", "v1", developerKey=key)
+        return service.cse().list(q=q, cx=cx, num=3)
+
+    def after(q):
+        return model.get_search_service().cse().list(q=q, cx=cx, num=3)
+
+    model.get_search_service()  # startup cost, paid once
+    print(f"offline, {args.n} queries (service construction + request build):")
+    print(f"  before: {time_per_query(before, args.n):8.3f} ms/query")
+    print(f"  after:  {time_per_query(after, args.n):8.3f} ms/query")
+
+    if args.live:
+        if not os.getenv("GOOGLE_API_KEY") or not os.getenv("SEARCH_ENGINE_ID"):
+            sys.exit("--live needs GOOGLE_API_KEY and SEARCH_ENGINE_ID")
+        print(f"live, {args.live} queries (includes network round-trip):")
+        print(f"  before: {time_per_query(lambda q: before(q).execute(), args.live):8.1f} ms/query")
+        print(f"  after:  {time_per_query(lambda q: after(q).execute(http=model.get_search_http()), args.live):8.1f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
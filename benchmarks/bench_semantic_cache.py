@@ -0,0 +1,82 @@
+# benchmarks/bench_semantic_cache.py
+#
+# Query latency and recall of the semantic verdict cache's HNSW index as it
+# grows, using random unit vectors of the embedding model's size (384 for
+# bge-small). Recall@1 is checked against an exact brute-force search.
+#
+#   python benchmarks/bench_semantic_cache.py [--rows N] [--queries N] [--ef N]
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import hnswlib
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from semantic_cache import HNSW_M, HNSW_EF_CONSTRUCTION, NEIGHBOURS, SEMANTIC_CACHE_EF
+
+DIM = 384
+CHUNK = 100000
+
+
+def unit_vectors(rng, n):
+    vectors = rng.standard_normal((n, DIM), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_nearest(data, queries):
+    best = np.full(len(queries), -1)
+    best_score = np.full(len(queries), -np.inf, dtype=np.float32)
+    for start in range(0, len(data), CHUNK):
+        scores = queries @ data[start:start + CHUNK].T
+        top = scores.argmax(axis=1)
+        top_score = scores[np.arange(len(queries)), top]
+        better = top_score > best_score
+        best[better] = top[better] + start
+        best_score[better] = top_score[better]
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--ef", type=int, default=SEMANTIC_CACHE_EF)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    data = unit_vectors(rng, args.rows)
+    # Queries are perturbed copies of stored vectors, like reworded claims
+    picks = rng.integers(0, args.rows, args.queries)
+    queries = data[picks] + 0.05 * unit_vectors(rng, args.queries)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    index = hnswlib.Index(space="cosine", dim=DIM)
+    index.init_index(max_elements=args.rows, ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+    started = time.perf_counter()
+    index.add_items(data, np.arange(args.rows))
+    build_s = time.perf_counter() - started
+    index.set_ef(args.ef)
+    index.set_num_threads(1)  # lookups run one at a time per request
+
+    latencies = []
+    found = []
+    for query in queries:
+        started = time.perf_counter()
+        labels, _ = index.knn_query(query, k=NEIGHBOURS)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found.append(labels[0][0])
+
+    recall = float(np.mean(np.array(found) == exact_nearest(data, queries)))
+    latencies.sort()
+    print(f"{args.rows} vectors, dim {DIM}, M={HNSW_M}, ef={args.ef}")
+    print(f"  build:   {build_s:.1f}s ({args.rows / build_s:.0f} vectors/s)")
+    print(f"  query:   p50 {statistics.median(latencies):.3f} ms, p99 {latencies[int(len(latencies) * 0.99)]:.3f} ms")
+    print(f"  recall@1: {recall:.4f}")
+
+
+if __name__ == "__main__":
+    main()
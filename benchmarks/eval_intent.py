@@ -0,0 +1,86 @@
+# benchmarks/eval_intent.py
+#
+# Offline evaluation of the local intent classifier against Gemini.
+# Input is JSONL with a "text" field; lines that already carry a "gemini"
+# label are not re-sent. --save-labels writes the labelled set back out so it
+# can be fed to `python intent_classifier.py train`.
+#
+#   python benchmarks/eval_intent.py inputs.jsonl [--model intent_model.json]
+#                                    [--confidence 0.9] [--save-labels labels.jsonl]
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from dotenv import load_dotenv
+load_dotenv()
+
+from intent_classifier import INTENT_CONFIDENCE, INTENT_MODEL_PATH, IntentClassifier
+
+
+def label_with_gemini(rows):
+    # Imported lazily: only needed for rows without a cached Gemini label
+    import google.generativeai as genai
+    from model import GEMINI_API_KEY, GEMINI_MODEL_NAME, build_intent_prompt, parse_intent
+
+    if not GEMINI_API_KEY:
+        raise SystemExit("GEMINI_API_KEY is required to label new inputs")
+    gemini = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    for row in rows:
+        started = time.perf_counter()
+        response = gemini.generate_content(build_intent_prompt(row["text"]))
+        row["gemini_ms"] = (time.perf_counter() - started) * 1000
+        row["gemini"] = parse_intent(response.text)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("data")
+    parser.add_argument("--model", default=INTENT_MODEL_PATH)
+    parser.add_argument("--confidence", type=float, default=INTENT_CONFIDENCE)
+    parser.add_argument("--save-labels")
+    args = parser.parse_args()
+
+    with open(args.data, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    unlabelled = [row for row in rows if "gemini" not in row]
+    if unlabelled:
+        label_with_gemini(unlabelled)
+    if args.save_labels:
+        with open(args.save_labels, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    classifier = IntentClassifier.load(args.model)
+    local_ms, confident, agree = [], 0, 0
+    for row in rows:
+        started = time.perf_counter()
+        intent = classifier.classify(row["text"], args.confidence)
+        local_ms.append((time.perf_counter() - started) * 1000)
+        if intent:
+            confident += 1
+            agree += intent == row["gemini"]
+
+    gemini_ms = [row["gemini_ms"] for row in rows if "gemini_ms" in row]
+    gemini_avg = statistics.mean(gemini_ms) if gemini_ms else None
+    coverage = confident / len(rows)
+    print(f"inputs:                {len(rows)}")
+    print(f"confidence threshold:  {args.confidence}")
+    print(f"decided locally:       {confident} ({coverage:.1%})")
+    print(f"agreement with Gemini: {agree / confident:.1%} of local decisions" if confident else
+          "agreement with Gemini: n/a (no confident local decisions)")
+    print(f"local latency:         {statistics.mean(local_ms):.3f} ms avg")
+    if gemini_avg is not None:
+        saved = coverage * gemini_avg - statistics.mean(local_ms)
+        print(f"Gemini latency:        {gemini_avg:.0f} ms avg over {len(gemini_ms)} calls")
+        print(f"latency saved:         {saved:.0f} ms per input on average")
+    else:
+        print("Gemini latency:        not measured (all labels cached)")
+
+
+if __name__ == "__main__":
+    main()
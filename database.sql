@@ -37,8 +37,11 @@ CREATE TABLE IF NOT EXISTS submission (
   language      VARCHAR(10) NULL,
   content_hash  CHAR(64) NOT NULL,    
   created_at    TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  input_preview VARCHAR(120) GENERATED ALWAYS AS (LEFT(input_text, 120)) STORED,
   UNIQUE KEY uq_content (content_hash),
-  FULLTEXT KEY ft_input (input_text)  
+  FULLTEXT KEY ft_input (input_text),
+  -- covers the chat-history query (see migrations/001_submission_history_index.sql)
+  INDEX idx_submission_user_history (user_id, id, input_preview)
 ) ENGINE=InnoDB;
 
 -- Results
@@ -70,10 +73,19 @@ CREATE TABLE IF NOT EXISTS final_decision (
   final_confidence  DECIMAL(5,4) NULL,
   final_explanation MEDIUMTEXT NULL,
   decided_at        TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE KEY uq_final_submission (submission_id),
   CONSTRAINT fk_final_submission
     FOREIGN KEY (submission_id) REFERENCES submission(id) ON DELETE CASCADE
 ) ENGINE=InnoDB;
 
+-- Finalization watermark: last result.id folded into final_decision
+CREATE TABLE IF NOT EXISTS finalize_state (
+  name           VARCHAR(32) PRIMARY KEY,
+  last_result_id BIGINT NOT NULL DEFAULT 0
+) ENGINE=InnoDB;
+
+INSERT IGNORE INTO finalize_state (name, last_result_id) VALUES ('final_decision', 0);
+
 -- Feedback
 CREATE TABLE IF NOT EXISTS feedback (
   id             BIGINT PRIMARY KEY AUTO_INCREMENT,
@@ -87,81 +99,12 @@ CREATE TABLE IF NOT EXISTS feedback (
 ) ENGINE=InnoDB;
 
 -- ======================
--- Procedure + Triggers
+-- Finalization
 -- ======================
-DELIMITER $$
-
-CREATE PROCEDURE compute_final(IN p_submission_id BIGINT)
-BEGIN
-   DECLARE v_src VARCHAR(100);
-   DECLARE v_verdict VARCHAR(20);
-   DECLARE v_conf DECIMAL(5,4);
-   DECLARE v_expl MEDIUMTEXT;
-
-   -- Prefer Google Fact Check
-   SELECT 'google_fact_check', verdict, IFNULL(confidence,1.0), explanation
-      INTO v_src, v_verdict, v_conf, v_expl
-   FROM result
-   WHERE submission_id=p_submission_id
-     AND source='google_fact_check'
-   ORDER BY confidence DESC
-   LIMIT 1;
-
-   -- If no Google result, check own_model
-   IF v_src IS NULL THEN
-      SELECT 'own_model', verdict, IFNULL(confidence,0), explanation
-        INTO v_src, v_verdict, v_conf, v_expl
-      FROM result
-      WHERE submission_id=p_submission_id
-        AND source='own_model'
-      ORDER BY confidence DESC
-      LIMIT 1;
-
-      -- If confidence too low, fall back to Gemini
-      IF v_src IS NULL OR v_conf < 0.60 THEN
-         SELECT 'gemini', verdict, IFNULL(confidence,NULL), explanation
-           INTO v_src, v_verdict, v_conf, v_expl
-         FROM result
-         WHERE submission_id=p_submission_id
-           AND source='gemini'
-         ORDER BY confidence DESC
-         LIMIT 1;
-      END IF;
-   END IF;
-
-   -- Default to unknown
-   IF v_src IS NULL THEN
-      SET v_src='gemini';
-      SET v_verdict='unknown';
-      SET v_conf=NULL;
-      SET v_expl=NULL;
-   END IF;
-
-   -- Insert or update final_decision
-   INSERT INTO final_decision
-   (submission_id, final_source, final_verdict, final_confidence, final_explanation)
-   VALUES (p_submission_id, v_src, v_verdict, v_conf, v_expl)
-   ON DUPLICATE KEY UPDATE
-     final_source = VALUES(final_source),
-     final_verdict = VALUES(final_verdict),
-     final_confidence = VALUES(final_confidence),
-     final_explanation = VALUES(final_explanation),
-     decided_at = CURRENT_TIMESTAMP;
-END$$
-
--- Triggers
-CREATE TRIGGER trg_result_ai
-AFTER INSERT ON result
-FOR EACH ROW BEGIN
-  CALL compute_final(NEW.submission_id);
-END$$
-
-CREATE TRIGGER trg_result_au
-AFTER UPDATE ON result
-FOR EACH ROW BEGIN
-  CALL compute_final(NEW.submission_id);
-END$$
-DELIMITER ;
+-- final_decision is filled by the application in set-based batches
+-- (db.finalize_submissions / db.finalize_pending), not by triggers.
+-- See migrations/002_set_based_finalization.sql and
+-- migrations/003_finalize_watermark.sql.
 
 -- ======================
 -- Views
@@ -229,7 +172,6 @@ VALUES
 -- ======================
 -- Indexes
 -- ======================
-CREATE INDEX idx_submission_user ON submission(user_id);
 CREATE INDEX indx_result_submission ON result(submission_id);
 
 -- ✅ Removed app_user creation since you are using root@localhost
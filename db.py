@@ -0,0 +1,370 @@
+# backend/db.py
+
+import os
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+import mysql.connector
+from mysql.connector import Error
+
+# --- Database configuration ---
+DB_HOST = os.getenv("DB_HOST")
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_NAME = os.getenv("DB_NAME")
+
+
+# --- Connection pool ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+def connect():
+    return mysql.connector.connect(
+        host=DB_HOST,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME
+    )
+
+
+class PoolTimeout(Error):
+    pass
+
+
+class PooledConnection:
+    # Behaves like the mysql connection it wraps; close() hands it back to the pool
+    def __init__(self, pool, conn, created_at):
+        self._pool = pool
+        self._conn = conn
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn, self._created_at)
+            self._conn = None
+
+
+class ConnectionPool:
+    # Keeps up to `size` idle connections; up to `max_overflow` extra ones are
+    # opened under load and closed again when returned.
+    def __init__(self, size, max_overflow, timeout, recycle):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self._idle = deque()  # (conn, created_at), most recently used last
+        self._cond = threading.Condition()
+        self._total = 0
+        self._in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.recycled = 0
+        self.failed_checks = 0
+
+    def checkout(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, created_at = self._idle.pop()
+                    break
+                if self._total < self.size + self.max_overflow:
+                    self._total += 1
+                    conn, created_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"no connection available within {self.timeout}s")
+                self.waits += 1
+                self._cond.wait(remaining)
+
+        if conn is not None and time.time() - created_at > self.recycle:
+            self.recycled += 1
+            self._discard(conn)
+            conn = None
+        elif conn is not None and not conn.is_connected():
+            self.failed_checks += 1
+            self._discard(conn)
+            conn = None
+
+        if conn is None:
+            try:
+                conn, created_at = connect(), time.time()
+            except Exception:
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+                raise
+
+        with self._cond:
+            self._in_use += 1
+            self.checkouts += 1
+        return PooledConnection(self, conn, created_at)
+
+    def release(self, conn, created_at):
+        try:
+            conn.rollback()  # never hand out a connection with an open transaction
+            reusable = True
+        except Exception:
+            reusable = False
+        with self._cond:
+            self._in_use -= 1
+            if reusable and len(self._idle) < self.size:
+                self._idle.append((conn, created_at))
+                conn = None
+            else:
+                self._total -= 1
+            self._cond.notify()
+        if conn is not None:
+            self._discard(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._total -= len(idle)
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": self._total,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "saturation": round(self._in_use / (self.size + self.max_overflow), 4),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "recycled": self.recycled,
+                "failed_checks": self.failed_checks,
+            }
+
+
+db_pool = ConnectionPool(DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE)
+
+
+# --- Database connection ---
+def get_db_connection():
+    try:
+        return db_pool.checkout()
+    except Error as e:
+        print(f"❌ DB connection error: {e}")
+        return None
+
+
+# --- Verdict cache (submission.content_hash -> final_decision) ---
+# How long (seconds) a stored verdict is served before the pipeline runs again
+VERDICT_CACHE_TTLS = {
+    "true": int(os.getenv("VERDICT_CACHE_TTL_TRUE", "604800")),
+    "false": int(os.getenv("VERDICT_CACHE_TTL_FALSE", "604800")),
+    "unknown": int(os.getenv("VERDICT_CACHE_TTL_UNKNOWN", "3600")),
+}
+
+
+def normalize_claim(text):
+    return " ".join(text.lower().split()).strip(" .!?")
+
+
+def claim_hash(text):
+    return hashlib.sha256(normalize_claim(text).encode("utf-8")).hexdigest()
+
+
+def saved_chat_hash(user_id, text):
+    # content_hash for chats saved by a user: scoped to the user so it never
+    # collides with another user's chat or with the verdict cache's claim rows
+    return hashlib.sha256(f"{user_id}:{text}".encode("utf-8")).hexdigest()
+
+
+def get_cached_verdict(claim):
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(
+            """
+            SELECT f.final_verdict, f.final_explanation,
+                   TIMESTAMPDIFF(SECOND, f.decided_at, NOW()) AS age_s
+            FROM submission s
+            JOIN final_decision f ON f.submission_id = s.id
+            WHERE s.content_hash = %s
+            ORDER BY f.decided_at DESC, f.id DESC
+            LIMIT 1
+            """,
+            (claim_hash(claim),)
+        )
+        row = cursor.fetchone()
+    except Error as e:
+        print(f"❌ Verdict cache lookup error: {e}")
+        return None
+    finally:
+        conn.close()
+
+    if not row or not row["final_explanation"]:
+        return None
+    if row["age_s"] > VERDICT_CACHE_TTLS.get(row["final_verdict"], 0):
+        return None
+    return row["final_explanation"]
+
+
+# --- Finalization (result -> final_decision) ---
+# One INSERT ... SELECT decides any number of submissions at once. Precedence
+# matches the old compute_final procedure: google_fact_check first, then
+# own_model when its confidence is at least 0.60, then gemini, then a
+# low-confidence own_model result; ties go to the highest confidence.
+# decided_at (the verdict cache's age) only moves when the decision changes;
+# it is assigned first because MySQL applies the assignments left to right.
+FINALIZE_SQL = """
+    INSERT INTO final_decision
+      (submission_id, final_source, final_verdict, final_confidence, final_explanation)
+    SELECT submission_id, source, verdict, confidence, explanation
+    FROM (
+      SELECT r.submission_id, r.source, r.verdict, r.explanation,
+             CASE r.source
+               WHEN 'google_fact_check' THEN IFNULL(r.confidence, 1.0)
+               WHEN 'own_model' THEN IFNULL(r.confidence, 0)
+               ELSE r.confidence
+             END AS confidence,
+             ROW_NUMBER() OVER (
+               PARTITION BY r.submission_id
+               ORDER BY CASE
+                          WHEN r.source = 'google_fact_check' THEN 0
+                          WHEN r.source = 'own_model' AND IFNULL(r.confidence, 0) >= 0.60 THEN 1
+                          WHEN r.source = 'gemini' THEN 2
+                          ELSE 3
+                        END,
+                        r.confidence DESC
+             ) AS rn
+      FROM result r
+      WHERE {where}
+    ) ranked
+    WHERE rn = 1
+    ON DUPLICATE KEY UPDATE
+      decided_at = IF(
+        final_source <=> VALUES(final_source)
+          AND final_verdict <=> VALUES(final_verdict)
+          AND final_confidence <=> VALUES(final_confidence)
+          AND final_explanation <=> VALUES(final_explanation),
+        decided_at, CURRENT_TIMESTAMP),
+      final_source = VALUES(final_source),
+      final_verdict = VALUES(final_verdict),
+      final_confidence = VALUES(final_confidence),
+      final_explanation = VALUES(final_explanation)
+"""
+
+# finalize_pending walks result by primary key from a watermark persisted in
+# finalize_state, so each run is an index range scan however large result is.
+# Rows younger than FINALIZE_SETTLE_SECONDS are left for the next run, so ids
+# from transactions that commit out of order are not skipped. Updates to
+# existing result rows are finalized by their writer (see store_result).
+FINALIZE_WATERMARK_SQL = "SELECT last_result_id FROM finalize_state WHERE name = 'final_decision' FOR UPDATE"
+PENDING_RESULTS_SQL = """
+    SELECT id, submission_id, created_at >= NOW() - INTERVAL %s SECOND AS settling
+    FROM result
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s
+"""
+SAVE_WATERMARK_SQL = (
+    "INSERT INTO finalize_state (name, last_result_id) VALUES ('final_decision', %s) "
+    "ON DUPLICATE KEY UPDATE last_result_id = VALUES(last_result_id)"
+)
+FINALIZE_BATCH_SIZE = int(os.getenv("FINALIZE_BATCH_SIZE", "5000"))
+FINALIZE_INTERVAL = int(os.getenv("FINALIZE_INTERVAL", "60"))
+FINALIZE_SETTLE_SECONDS = int(os.getenv("FINALIZE_SETTLE_SECONDS", "5"))
+
+
+def finalize_submissions(cursor, submission_ids):
+    if submission_ids:
+        placeholders = ", ".join(["%s"] * len(submission_ids))
+        cursor.execute(FINALIZE_SQL.format(where=f"r.submission_id IN ({placeholders})"), tuple(submission_ids))
+
+
+def finalize_pending(batch_size=FINALIZE_BATCH_SIZE):
+    # Periodic job: catches results written outside store_result (bulk imports,
+    # other sources). Returns how many result rows the watermark advanced over;
+    # the FOR UPDATE lock keeps workers from processing the same batch.
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    try:
+        cursor = conn.cursor()
+        cursor.execute(FINALIZE_WATERMARK_SQL)
+        row = cursor.fetchone()
+        last_id = row[0] if row else 0
+        cursor.execute(PENDING_RESULTS_SQL, (FINALIZE_SETTLE_SECONDS, last_id, batch_size))
+        rows = []
+        for result_id, submission_id, settling in cursor.fetchall():
+            if settling:
+                break
+            rows.append((result_id, submission_id))
+        if rows:
+            finalize_submissions(cursor, sorted({submission_id for _, submission_id in rows}))
+            cursor.execute(SAVE_WATERMARK_SQL, (rows[-1][0],))
+        conn.commit()
+        return len(rows)
+    except Error as e:
+        print(f"❌ Finalization error: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+# --- Pipeline results ---
+def store_result(result, source="gemini"):
+    # Upserts the submission for the claim and its per-source result row, then
+    # refreshes the submission's final_decision in the same transaction.
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO submission (input_type, input_text, content_hash) VALUES ('text', %s, %s) "
+            "ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)",
+            (result.claim, claim_hash(result.claim))
+        )
+        submission_id = cursor.lastrowid
+        raw = {"label": result.label, "stage_ms": result.stage_ms}
+        cursor.execute(
+            """
+            INSERT INTO result
+              (submission_id, source, verdict, confidence, explanation, citations, raw, model_version, latency_ms)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+              verdict = VALUES(verdict),
+              confidence = VALUES(confidence),
+              explanation = VALUES(explanation),
+              citations = VALUES(citations),
+              raw = VALUES(raw),
+              model_version = VALUES(model_version),
+              latency_ms = VALUES(latency_ms),
+              created_at = CURRENT_TIMESTAMP
+            """,
+            (submission_id, source, result.verdict, result.confidence, result.report,
+             json.dumps(result.sources), json.dumps(raw), result.model_version, result.latency_ms)
+        )
+        finalize_submissions(cursor, [submission_id])
+        conn.commit()
+    except Error as e:
+        print(f"❌ Result store error: {e}")
+    finally:
+        conn.close()
@@ -0,0 +1,222 @@
+# backend/extraction.py
+
+import codecs
+import os
+import re
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+# Paragraph-text extraction backends for the scraper. Every backend is fed
+# decoded HTML chunk by chunk and approximates the bs4 reference
+# ' '.join(p.get_text() for p in soup.find_all('p'))[:limit]. Output is close
+# but not identical: parsers differ on unclosed <p> tags and <template>
+# content (see benchmarks/bench_extraction.py for the measured similarity).
+DEFAULT_LIMIT = 2500
+
+
+# --- lxml (default): incremental C parser ---
+class LxmlParagraphExtractor:
+    def __init__(self, limit=DEFAULT_LIMIT):
+        self.limit = limit
+        self.paragraphs = []
+        self.length = 0
+        self._parser = etree.HTMLPullParser(events=("end",), tag="p")
+
+    def feed(self, data):
+        self._parser.feed(data)
+        self._drain()
+
+    def _drain(self):
+        for _, element in self._parser.read_events():
+            paragraph = "".join(element.itertext())
+            self.paragraphs.append(paragraph)
+            self.length += len(paragraph) + 1
+            element.clear(keep_tail=True)  # the tree is never read again
+
+    @property
+    def done(self):
+        return self.length >= self.limit
+
+    def text(self):
+        try:
+            self._parser.close()
+        except etree.LxmlError:
+            pass  # nothing was fed
+        self._drain()
+        return " ".join(self.paragraphs)[:self.limit]
+
+
+# --- html.parser: incremental pure-Python parser ---
+class ParagraphExtractor(HTMLParser):
+    def __init__(self, limit=DEFAULT_LIMIT):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.paragraphs = []
+        self.length = 0
+        self._current = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "p":
+            self._close_paragraph()  # an open <p> is implicitly closed by the next one
+            self._current = []
+
+    def handle_endtag(self, tag):
+        if tag == "p":
+            self._close_paragraph()
+
+    def handle_data(self, data):
+        if self._current is not None:
+            self._current.append(data)
+
+    def _close_paragraph(self):
+        if self._current is not None:
+            paragraph = "".join(self._current)
+            self.paragraphs.append(paragraph)
+            self.length += len(paragraph) + 1
+            self._current = None
+
+    @property
+    def done(self):
+        return self.length >= self.limit
+
+    def text(self):
+        self._close_paragraph()
+        return " ".join(self.paragraphs)[:self.limit]
+
+
+# --- bs4: the original BeautifulSoup path (buffers the whole body) ---
+class SoupParagraphExtractor:
+    done = False
+
+    def __init__(self, limit=DEFAULT_LIMIT):
+        self.limit = limit
+        self._chunks = []
+
+    def feed(self, data):
+        self._chunks.append(data)
+
+    def text(self):
+        soup = BeautifulSoup("".join(self._chunks), 'html.parser')
+        paragraphs = soup.find_all('p')
+        return ' '.join([p.get_text() for p in paragraphs])[:self.limit]
+
+
+EXTRACTION_BACKENDS = {
+    "lxml": LxmlParagraphExtractor,
+    "html.parser": ParagraphExtractor,
+    "bs4": SoupParagraphExtractor,
+}
+
+
+def available_backends():
+    return [
+        name for name in EXTRACTION_BACKENDS
+        if (name != "lxml" or etree is not None) and (name != "bs4" or BeautifulSoup is not None)
+    ]
+
+
+def resolve_backend(name):
+    available = available_backends()
+    if name in available:
+        return name
+    fallback = "bs4" if "bs4" in available else "html.parser"
+    print(f"⚠ Extraction backend '{name}' unavailable, falling back to '{fallback}'.")
+    return fallback
+
+
+SCRAPE_PARSER = resolve_backend(os.getenv("SCRAPE_PARSER", "lxml"))
+
+
+def make_extractor(limit=DEFAULT_LIMIT, backend=None):
+    return EXTRACTION_BACKENDS[backend or SCRAPE_PARSER](limit)
+
+
+def extract_paragraph_text(html, limit=DEFAULT_LIMIT, backend=None):
+    extractor = make_extractor(limit, backend)
+    extractor.feed(html)
+    return extractor.text()
+
+
+# --- Charset detection ---
+# Browser precedence: byte order mark, then the Content-Type charset, then a
+# <meta charset> / http-equiv declaration in the first SNIFF_BYTES of the page.
+SNIFF_BYTES = 4096
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+META_CHARSET = re.compile(rb"""<meta[^>]*?charset\s*=\s*["']?\s*([\w.:-]+)""", re.IGNORECASE)
+
+
+def detect_charset(head, declared=None):
+    # head: the first bytes of the body; declared: the Content-Type charset, if any
+    for bom, name in BOMS:
+        if head.startswith(bom):
+            return name
+    if declared:
+        return declared
+    match = META_CHARSET.search(head)
+    if match:
+        try:
+            name = codecs.lookup(match.group(1).decode("ascii")).name
+        except LookupError:
+            return "utf-8"
+        if name.startswith("utf-16"):  # a meta tag readable as ASCII cannot be UTF-16
+            return "utf-8"
+        return "cp1252" if name in ("latin-1", "iso8859-1", "ascii") else name
+    return "utf-8"
+
+
+def extract_page_text(body, charset=None, limit=DEFAULT_LIMIT, backend=None):
+    # Entry point for the process pool: raw body bytes in, paragraph text out
+    charset = detect_charset(body[:SNIFF_BYTES], charset)
+    return extract_paragraph_text(body.decode(charset, errors="replace"), limit, backend)
+
+
+# --- Streamed pages ---
+class PageTextReader:
+    # Decodes a streamed body chunk by chunk; feed() returns True once max_bytes
+    # is hit or enough paragraph text has been collected. The first SNIFF_BYTES
+    # are held back to look for a BOM or <meta charset> first.
+    def __init__(self, declared=None, limit=DEFAULT_LIMIT, max_bytes=None, backend=None):
+        self._declared = declared
+        self._decoder = None
+        self._head = b""
+        self._extractor = make_extractor(limit, backend)
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+
+    def feed(self, chunk):
+        if self.max_bytes is not None:
+            chunk = chunk[:self.max_bytes - self.bytes_read]
+        self.bytes_read += len(chunk)
+        capped = self.max_bytes is not None and self.bytes_read >= self.max_bytes
+        if self._decoder is None:
+            self._head += chunk
+            if len(self._head) >= SNIFF_BYTES or capped:
+                self._start_decoding()
+        else:
+            self._extractor.feed(self._decoder.decode(chunk))
+        return self._extractor.done or capped
+
+    def _start_decoding(self):
+        charset = detect_charset(self._head, self._declared)
+        self._decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+        self._extractor.feed(self._decoder.decode(self._head))
+        self._head = b""
+
+    def text(self):
+        if self._decoder is None:
+            self._start_decoding()
+        self._extractor.feed(self._decoder.decode(b"", final=True))
+        return self._extractor.text()
@@ -0,0 +1,127 @@
+# backend/intent_classifier.py
+#
+# Local intent classifier: hashed word/char n-gram features and a logistic
+# regression, small enough to score an input in well under a millisecond.
+# recognize_intent_async uses it first and only asks Gemini when it is unsure.
+#
+# Train from Gemini-labelled inputs (see benchmarks/eval_intent.py --save-labels):
+#   python intent_classifier.py train labels.jsonl [--out intent_model.json]
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import zlib
+from pathlib import Path
+
+CLAIM = "fact_checking_claim"
+QUESTION = "general_question"
+N_FEATURES = 2 ** 18
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", str(Path(__file__).resolve().parent / "intent_model.json"))
+INTENT_CONFIDENCE = float(os.getenv("INTENT_CONFIDENCE", "0.9"))
+
+TOKEN_PATTERN = re.compile(r"\w+|[?!]", re.UNICODE)
+
+
+def hashed_features(text, n_features=N_FEATURES):
+    # Sparse {bucket: weight}; crc32 keeps buckets stable across processes
+    text = text.lower()
+    tokens = TOKEN_PATTERN.findall(text)
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    padded = f" {' '.join(tokens)} "
+    grams += [f"#{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    features = {}
+    for gram in grams:
+        bucket = zlib.crc32(gram.encode("utf-8")) % n_features
+        features[bucket] = features.get(bucket, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+    return {k: v / norm for k, v in features.items()}
+
+
+class IntentClassifier:
+    def __init__(self, weights=None, bias=0.0, n_features=N_FEATURES):
+        self.n_features = n_features
+        self.weights = weights or {}  # sparse: bucket -> weight
+        self.bias = bias
+
+    def claim_probability(self, text):
+        features = hashed_features(text, self.n_features)
+        score = self.bias + sum(self.weights.get(k, 0.0) * v for k, v in features.items())
+        return 1.0 / (1.0 + math.exp(-max(min(score, 30.0), -30.0)))
+
+    def classify(self, text, confidence=INTENT_CONFIDENCE):
+        # Returns an intent, or None when neither class reaches `confidence`
+        p = self.claim_probability(text)
+        if p >= confidence:
+            return CLAIM
+        if 1.0 - p >= confidence:
+            return QUESTION
+        return None
+
+    def train(self, examples, epochs=10, learning_rate=0.5, l2=1e-5, seed=13):
+        # Plain SGD on log loss; examples are (text, intent) pairs
+        data = [(hashed_features(text, self.n_features), 1.0 if intent == CLAIM else 0.0)
+                for text, intent in examples]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            rate = learning_rate / (1 + epoch)
+            for features, target in data:
+                score = self.bias + sum(self.weights.get(k, 0.0) * v for k, v in features.items())
+                error = 1.0 / (1.0 + math.exp(-max(min(score, 30.0), -30.0))) - target
+                for k, v in features.items():
+                    w = self.weights.get(k, 0.0)
+                    self.weights[k] = w - rate * (error * v + l2 * w)
+                self.bias -= rate * error
+        return self
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"n_features": self.n_features, "bias": self.bias,
+                       "weights": {str(k): round(w, 6) for k, w in self.weights.items() if abs(w) > 1e-6}}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        weights = {int(k): w for k, w in data["weights"].items()}
+        return cls(weights, data["bias"], data["n_features"])
+
+
+def load_intent_classifier(path=INTENT_MODEL_PATH):
+    if not os.path.exists(path):
+        return None
+    try:
+        return IntentClassifier.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠ Could not load intent model {path}: {e}")
+        return None
+
+
+def read_labelled(path):
+    # JSONL lines with "text" and the Gemini label under "gemini"
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row["text"], row["gemini"]) for row in rows if row.get("gemini") in (CLAIM, QUESTION)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train")
+    train.add_argument("data")
+    train.add_argument("--out", default=INTENT_MODEL_PATH)
+    train.add_argument("--epochs", type=int, default=10)
+    args = parser.parse_args()
+
+    examples = read_labelled(args.data)
+    if not examples:
+        raise SystemExit(f"No labelled examples in {args.data}")
+    IntentClassifier().train(examples, epochs=args.epochs).save(args.out)
+    print(f"Trained on {len(examples)} examples -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,67 +2,83 @@
 
 import os
 import sys
+import asyncio
+import hashlib
+import json
+import tempfile
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent))  # ensures current folder is in path
 from dotenv import load_dotenv
 load_dotenv()
 
-from model import freaksearch_handler, get_text_from_image
-
+from contextlib import asynccontextmanager
 from pathlib import Path
-import mysql.connector
-from mysql.connector import Error
-from passlib.context import CryptContext
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 # Import your custom AI model
-from model import freaksearch_handler, get_text_from_image  # Assuming you have OCR support
-
-# --- Password hashing ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# --- Database configuration ---
-DB_HOST = os.getenv("DB_HOST")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_NAME = os.getenv("DB_NAME")
+from model import freaksearch_handler_async, close_async_client, init_search_client, search_cache, scrape_cache
+from model import warm_up_models, freaksearch_stream
+import repository
+from db import db_pool, finalize_pending, FINALIZE_INTERVAL, FINALIZE_BATCH_SIZE
+from repository import DatabaseUnavailable, db_executor, run_db, submission_writer, SAVE_WRITE_BEHIND
+from auth import HashingBusy, hashing_pool, hash_password_async, verify_password_async
+from auth import InvalidSession, create_session_token, decode_session_token, revoke_session
+from workers import PoolBusy, cpu_pool
+from semantic_cache import semantic_cache
+
+# --- Chat history paging ---
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+HISTORY_PAGE_MAX = int(os.getenv("HISTORY_PAGE_MAX", "100"))
 
 # --- Uploads directory ---
 BASE_DIR = Path(__file__).resolve().parent
 UPLOADS_DIR = BASE_DIR / "uploads"
 UPLOADS_DIR.mkdir(exist_ok=True)
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_FORM_OVERHEAD = 64 * 1024  # multipart boundaries and headers around the file
+# Temp files are created 0600; finished uploads get the mode open() would give them
+_umask = os.umask(0)
+os.umask(_umask)
+UPLOAD_FILE_MODE = 0o666 & ~_umask
+
+# --- Background jobs ---
+async def run_finalizer():
+    # Set-based final_decision refresh; drains large backlogs batch by batch
+    while True:
+        await asyncio.sleep(FINALIZE_INTERVAL)
+        while await run_db(finalize_pending) >= FINALIZE_BATCH_SIZE:
+            pass
 
-# --- FastAPI app ---
-app = FastAPI()
-
-
-# --- Database connection ---
-def get_db_connection():
-    try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        if conn.is_connected():
-            return conn
-    except Error as e:
-        print(f"❌ DB connection error: {e}")
-        return None
-
-
-# --- Password helpers ---
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
 
-
-def hash_password(password):
-    return pwd_context.hash(password)
+# --- FastAPI app ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_search_client()
+    await warm_up_models()
+    await asyncio.to_thread(semantic_cache.start)
+    cpu_pool.start()
+    if SAVE_WRITE_BEHIND:
+        submission_writer.start()
+    finalizer = asyncio.create_task(run_finalizer()) if FINALIZE_INTERVAL > 0 else None
+    yield
+    if finalizer:
+        finalizer.cancel()
+    await submission_writer.stop()
+    await close_async_client()
+    semantic_cache.close()
+    cpu_pool.shutdown()
+    db_executor.shutdown(wait=True)
+    hashing_pool.shutdown()
+    db_pool.close_all()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 # --- Pydantic models ---
@@ -92,40 +108,54 @@ class ChatRequest(BaseModel):
     chatHistory: List[ChatMessage]
 
 
+# --- Errors ---
+@app.exception_handler(DatabaseUnavailable)
+async def database_unavailable_handler(request, exc):
+    return JSONResponse(status_code=500, content={"detail": "Database connection failed."})
+
+
+@app.exception_handler(HashingBusy)
+async def hashing_busy_handler(request, exc):
+    return JSONResponse(status_code=503, content={"detail": "Server is busy, please try again."})
+
+
+@app.exception_handler(PoolBusy)
+async def pool_busy_handler(request, exc):
+    return JSONResponse(status_code=503, content={"detail": "Server is busy, please try again."})
+
+
+# --- Sessions ---
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+async def get_current_session(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
+    if not credentials:
+        raise HTTPException(status_code=401, detail="Not authenticated.")
+    try:
+        return decode_session_token(credentials.credentials)
+    except InvalidSession:
+        raise HTTPException(status_code=401, detail="Invalid or expired session.")
+
+
 # --- User auth endpoints ---
 @app.post("/api/register")
 async def register_user(user: UserRegister):
-    conn = get_db_connection()
-    if not conn:
-        return JSONResponse(status_code=500, content={"detail": "Database connection failed."})
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE username = %s OR email = %s", (user.username, user.email))
-        if cursor.fetchone():
-            return JSONResponse(status_code=400, content={"detail": "Username or email already exists."})
-
-        hashed_pw = hash_password(user.password)
-        cursor.execute(
-            "INSERT INTO users (username, password_hash, email, full_name, status) VALUES (%s, %s, %s, %s, %s)",
-            (user.username, hashed_pw, user.email, user.full_name, "active")
-        )
-        conn.commit()
-        return {"message": f"User '{user.username}' registered successfully."}
-    finally:
-        conn.close()
+    if await repository.user_exists(user.username, user.email):
+        return JSONResponse(status_code=400, content={"detail": "Username or email already exists."})
+
+    hashed_pw = await hash_password_async(user.password)
+    user_id = await repository.create_user(user.username, hashed_pw, user.email, user.full_name)
+    return {
+        "message": f"User '{user.username}' registered successfully.",
+        "token": create_session_token(user_id, user.username)
+    }
 
 
 @app.post("/api/login")
 async def login_user(user: UserLogin):
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection failed.")
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM users WHERE username = %s", (user.username,))
-    db_user = cursor.fetchone()
-    conn.close()
-
-    if not db_user or not verify_password(user.password, db_user["password_hash"]):
+    db_user = await repository.find_user_by_username(user.username)
+
+    if not db_user or not await verify_password_async(user.password, db_user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid username or password.")
 
     if db_user["status"] != "active":
@@ -133,6 +163,7 @@ async def login_user(user: UserLogin):
 
     return {
         "message": "Login successful!",
+        "token": create_session_token(db_user["user_id"], db_user["username"]),
         "user": {
             "id": db_user["user_id"],
             "username": db_user["username"],
@@ -143,50 +174,154 @@ async def login_user(user: UserLogin):
     }
 
 
+@app.post("/api/logout")
+async def logout_user(session: dict = Depends(get_current_session)):
+    revoke_session(session)
+    return {"message": "Logged out."}
+
+
 # --- Chat history ---
 @app.get("/api/chat-history")
-async def get_chat_history(user_id: int):
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection failed.")
+async def get_chat_history(
+    before_id: Optional[int] = None,
+    limit: int = HISTORY_PAGE_SIZE,
+    session: dict = Depends(get_current_session)
+):
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
+    rows = await repository.list_submission_previews(int(session["sub"]), before_id, limit + 1)
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    return {"history": rows[:limit], "next_cursor": next_cursor}
 
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT id, input_text FROM submission WHERE user_id = %s ORDER BY id DESC", (user_id,))
-    submissions = cursor.fetchall()
-    conn.close()
-    return {"history": submissions}
 
+@app.get("/api/chat-history/{submission_id}")
+async def get_chat_entry(submission_id: int, session: dict = Depends(get_current_session)):
+    submission = await repository.get_submission(int(session["sub"]), submission_id)
+    if not submission:
+        raise HTTPException(status_code=404, detail="Chat not found.")
+    return submission
 
-@app.post("/api/save-chat")
-async def save_chat(user_id: int = Form(...), input_text: str = Form(...)):
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection failed.")
 
-    try:
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO submission (user_id, input_text) VALUES (%s, %s)", (user_id, input_text))
-        conn.commit()
-        return {"message": "Chat saved successfully", "id": cursor.lastrowid}
-    finally:
-        conn.close()
+@app.post("/api/save-chat")
+async def save_chat(input_text: str = Form(...), session: dict = Depends(get_current_session)):
+    if submission_writer.running and submission_writer.enqueue(int(session["sub"]), input_text):
+        return {"message": "Chat saved successfully", "id": None, "queued": True}
+    submission_id = await repository.create_submission(int(session["sub"]), input_text)
+    return {"message": "Chat saved successfully", "id": submission_id}
 
 
 # --- Chatbot endpoint (only your AI) ---
 @app.post("/api/chatbot")
-async def handle_chat(request: ChatRequest):
+async def handle_chat(request: ChatRequest, session: dict = Depends(get_current_session)):
     user_message = request.message
-    final_response = freaksearch_handler(user_message)
+    final_response = await freaksearch_handler_async(user_message)
     return {"text": final_response}
 
 
+@app.post("/api/chatbot/stream")
+async def handle_chat_stream(request: ChatRequest, session: dict = Depends(get_current_session)):
+    # Same pipeline as /api/chatbot, sent as Server-Sent Events while it runs
+    async def events():
+        async for event, data in freaksearch_stream(request.message):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# --- Metrics ---
+@app.get("/api/metrics")
+async def get_metrics():
+    return {
+        "search_cache": search_cache.stats(),
+        "scrape_cache": scrape_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "cpu_pool": cpu_pool.stats(),
+        "db_pool": db_pool.stats(),
+        "hashing": hashing_pool.stats(),
+        "submission_writer": submission_writer.stats(),
+    }
+
+
 # --- File upload endpoint ---
+class UploadSizeLimit:
+    # Pure ASGI middleware for one path. Counts request body bytes as they arrive
+    # (Content-Length or chunked) and fails with 413 as soon as max_bytes is
+    # passed, before Starlette has spooled the rest of the multipart body.
+    def __init__(self, app, path, max_bytes):
+        self.app = app
+        self.path = path
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            return await self.app(scope, receive, send)
+
+        too_large = JSONResponse(status_code=413, content={"detail": "File is too large."})
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            return await too_large(scope, receive, send)
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI re-raises HTTPExceptions from body parsing unchanged
+                    raise HTTPException(status_code=413, detail="File is too large.")
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except HTTPException as e:
+            if e.status_code != 413 or response_started:
+                raise
+            await too_large(scope, receive, send)
+
+
+app.add_middleware(UploadSizeLimit, path="/api/upload-media", max_bytes=UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD)
+
+
 @app.post("/api/upload-media")
-async def upload_media(file: UploadFile = File(...)):
-    file_path = UPLOADS_DIR / file.filename
-    with open(file_path, "wb") as buffer:
-        buffer.write(await file.read())
-    return {"message": f"File '{file.filename}' uploaded successfully."}
+async def upload_media(file: UploadFile = File(...), session: dict = Depends(get_current_session)):
+    filename = Path(file.filename or "upload").name
+    if filename in ("", ".", ".."):
+        raise HTTPException(status_code=400, detail="Invalid file name.")
+    file_path = UPLOADS_DIR / filename
+    digest = hashlib.sha256()  # same form as submission.content_hash
+    size = 0
+    # Unique temp file per upload, so concurrent uploads of the same name never share one
+    buffer = tempfile.NamedTemporaryFile(dir=UPLOADS_DIR, prefix=".upload-", suffix=".part", delete=False)
+    part_path = Path(buffer.name)
+    try:
+        with buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail="File is too large.")
+                digest.update(chunk)
+                await asyncio.to_thread(buffer.write, chunk)
+        os.chmod(part_path, UPLOAD_FILE_MODE)
+        os.replace(part_path, file_path)
+    finally:
+        part_path.unlink(missing_ok=True)
+    return {
+        "message": f"File '{filename}' uploaded successfully.",
+        "content_hash": digest.hexdigest(),
+        "size": size
+    }
 
 
 # --- Serve frontend ---
@@ -0,0 +1,16 @@
+-- Serve per-user chat history from an index instead of scanning submission.
+--
+-- input_preview is a stored generated copy of the first 120 characters of
+-- input_text. With (user_id, id, input_preview) indexed, the history query
+--   SELECT id, input_preview FROM submission
+--   WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?
+-- is answered from the index alone and never reads LONGTEXT pages.
+-- The old single-column idx_submission_user is a prefix of the new index.
+
+USE login_id;
+
+ALTER TABLE submission
+  ADD COLUMN input_preview VARCHAR(120)
+    GENERATED ALWAYS AS (LEFT(input_text, 120)) STORED,
+  ADD INDEX idx_submission_user_history (user_id, id, input_preview),
+  DROP INDEX idx_submission_user;
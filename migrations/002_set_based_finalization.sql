@@ -0,0 +1,27 @@
+-- Replace the per-row compute_final trigger with set-based finalization.
+--
+-- trg_result_ai/trg_result_au ran compute_final (three ordered SELECTs plus an
+-- upsert) for every single result row, and because final_decision had no
+-- unique key on submission_id its ON DUPLICATE KEY UPDATE never matched, so
+-- every call added another row. final_decision is now written by the
+-- application (db.finalize_submissions / db.finalize_pending) with one
+-- INSERT ... SELECT ... ON DUPLICATE KEY UPDATE per batch of submissions.
+
+USE login_id;
+
+DROP TRIGGER IF EXISTS trg_result_ai;
+DROP TRIGGER IF EXISTS trg_result_au;
+DROP PROCEDURE IF EXISTS compute_final;
+
+-- Keep only the newest decision per submission before adding the key
+DELETE older
+FROM final_decision older
+JOIN final_decision newer
+  ON newer.submission_id = older.submission_id
+ AND newer.id > older.id;
+
+ALTER TABLE final_decision
+  ADD UNIQUE KEY uq_final_submission (submission_id);
+
+-- Lets finalize_pending find results newer than their decision
+CREATE INDEX idx_result_created ON result(created_at);
@@ -0,0 +1,19 @@
+-- Drive finalize_pending from a persisted result.id watermark.
+--
+-- The pending-submissions query from 002 (results newer than their decision)
+-- could not use idx_result_created and scanned result joined to
+-- final_decision on every run. finalize_pending now reads
+-- "WHERE id > watermark ORDER BY id LIMIT n" on the primary key and stores the
+-- last id it processed here, so idx_result_created is no longer needed.
+
+USE login_id;
+
+CREATE TABLE IF NOT EXISTS finalize_state (
+  name           VARCHAR(32) PRIMARY KEY,
+  last_result_id BIGINT NOT NULL DEFAULT 0
+) ENGINE=InnoDB;
+
+-- Start from 0: the first runs re-finalize existing results once, in batches
+INSERT IGNORE INTO finalize_state (name, last_result_id) VALUES ('final_decision', 0);
+
+DROP INDEX idx_result_created ON result;
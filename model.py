@@ -1,12 +1,30 @@
 import os
-import requests
-from bs4 import BeautifulSoup
+import re
+import json
+import asyncio
+import codecs
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import urlsplit
+import httpx
+import httplib2
 from googleapiclient.discovery import build
 import google.generativeai as genai
 import pytesseract
 from PIL import Image
 import io
 
+from cache import LRUTTLCache
+from extraction import PageTextReader, extract_page_text, SCRAPE_PARSER
+from workers import cpu_pool
+from repository import run_db
+from intent_classifier import load_intent_classifier
+from db import get_cached_verdict, store_result, normalize_claim
+from semantic_cache import semantic_cache
+
 # --- Load API keys safely ---
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 SEARCH_ENGINE_ID = os.getenv("SEARCH_ENGINE_ID")
@@ -20,26 +38,247 @@ if not GEMINI_API_KEY:
 else:
     genai.configure(api_key=GEMINI_API_KEY)
 
+GEMINI_MODEL_NAME = 'gemini-1.5-flash-latest'
+SCRAPE_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+SCRAPE_TIMEOUT = 10
+MAX_SCRAPE_CHARS = 2500
+# Bodies are streamed and cut off after this many bytes
+SCRAPE_MAX_BYTES = int(os.getenv("SCRAPE_MAX_BYTES", str(2 * 1024 * 1024)))
+SCRAPE_CHUNK_SIZE = 16 * 1024
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+# Overall time budget (seconds) for scraping all sources of one claim
+SCRAPE_DEADLINE = float(os.getenv("SCRAPE_DEADLINE", "6"))
+# Connection pool limits for the scraper (scrapes keep hitting the same news domains)
+SCRAPE_MAX_CONNECTIONS = int(os.getenv("SCRAPE_MAX_CONNECTIONS", "100"))
+SCRAPE_MAX_PER_HOST = int(os.getenv("SCRAPE_MAX_PER_HOST", "6"))
+SCRAPE_KEEPALIVE = float(os.getenv("SCRAPE_KEEPALIVE", "30"))
+# Parse whole pages in the CPU process pool instead of incrementally in a
+# worker thread. Off by default: pool parsing has to download the body up to
+# SCRAPE_MAX_BYTES and pickle it, while the incremental reader stops as soon as
+# MAX_SCRAPE_CHARS of paragraph text have been collected.
+# The bs4 backend cannot stop early and buffers the whole body anyway, so it
+# always parses in the pool when the pool is running.
+SCRAPE_PARSE_IN_POOL = os.getenv("SCRAPE_PARSE_IN_POOL", "0") == "1" or SCRAPE_PARSER == "bs4"
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    SCRAPE_HTTP2 = True
+except ImportError:
+    SCRAPE_HTTP2 = False
+
+# --- Gemini clients (one per model name + config, kept for the process lifetime) ---
+_generative_models = {}
+_generative_models_lock = threading.Lock()
+
+
+def get_generative_model(name=GEMINI_MODEL_NAME, **config):
+    key = (name, json.dumps(config, sort_keys=True, default=str))
+    model = _generative_models.get(key)
+    if model is None:
+        with _generative_models_lock:
+            model = _generative_models.get(key)
+            if model is None:
+                model = _generative_models[key] = genai.GenerativeModel(name, **config)
+    return model
+
+
+async def warm_up_models():
+    # Opens the Gemini connection at startup so the first request skips the cold start
+    if not GEMINI_API_KEY:
+        return
+    try:
+        await get_generative_model().count_tokens_async("warm-up")
+    except Exception as e:
+        print(f"⚠ Gemini warm-up failed: {e}")
+
+# --- Async HTTP client (shared by all requests on the event loop) ---
+_async_client = None
+_host_slots = {}
+
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            headers=SCRAPE_HEADERS,
+            timeout=SCRAPE_TIMEOUT,
+            follow_redirects=True,
+            http2=SCRAPE_HTTP2,
+            limits=httpx.Limits(
+                max_connections=SCRAPE_MAX_CONNECTIONS,
+                max_keepalive_connections=SCRAPE_MAX_CONNECTIONS,
+                keepalive_expiry=SCRAPE_KEEPALIVE,
+            ),
+        )
+    return _async_client
+
+
+@asynccontextmanager
+async def host_slot(url):
+    # httpx only limits connections globally; cap concurrent fetches per host here.
+    # A host's [semaphore, users] entry is dropped once no fetch holds or waits on it.
+    host = urlsplit(url).hostname or ""
+    entry = _host_slots.get(host)
+    if entry is None:
+        entry = _host_slots[host] = [asyncio.Semaphore(SCRAPE_MAX_PER_HOST), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _host_slots[host]
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
 # --- Google Search Helper ---
+# Identical queries within SEARCH_CACHE_TTL seconds reuse the previous response.
+# Set SEARCH_CACHE_DB to a SQLite file path to share the cache between workers.
+search_cache = LRUTTLCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "1024")),
+    ttl=int(os.getenv("SEARCH_CACHE_TTL", "3600")),
+    db_path=os.getenv("SEARCH_CACHE_DB") or None,
+    name="search_cache",
+)
+
+
+SEARCH_TIMEOUT = 10
+
+# The service object is built once; httplib2.Http is not thread-safe, so every
+# worker thread executes requests over its own keep-alive connection.
+_search_service = None
+_search_service_lock = threading.Lock()
+_search_http = threading.local()
+
+
+def get_search_service():
+    global _search_service
+    if _search_service is None:
+        with _search_service_lock:
+            if _search_service is None:
+                _search_service = build(
+                    "customsearch", "v1", developerKey=GOOGLE_API_KEY, cache_discovery=False
+                )
+    return _search_service
+
+
+def get_search_http():
+    http = getattr(_search_http, "http", None)
+    if http is None:
+        http = _search_http.http = httplib2.Http(timeout=SEARCH_TIMEOUT)
+    return http
+
+
+def init_search_client():
+    if GOOGLE_API_KEY and SEARCH_ENGINE_ID:
+        get_search_service()
+
+
 def search_the_web_google(query):
     if not GOOGLE_API_KEY or not SEARCH_ENGINE_ID:
         return []  # skip search if key missing
+    cache_key = normalize_claim(query)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
     try:
-        service = build("customsearch", "v1", developerKey=GOOGLE_API_KEY)
-        res = service.cse().list(q=query, cx=SEARCH_ENGINE_ID, num=3).execute()
-        return res.get('items', [])
+        request = get_search_service().cse().list(q=query, cx=SEARCH_ENGINE_ID, num=3)
+        res = request.execute(http=get_search_http())
+        items = res.get('items', [])
+        if items:
+            search_cache.set(cache_key, items)
+        return items
     except Exception as e:
         print(f"Google API search error: {e}")
         return []
 
+async def search_the_web_google_async(query):
+    # googleapiclient has no async transport, so keep it off the event loop
+    return await asyncio.to_thread(search_the_web_google, query)
+
 # --- Scraping ---
-def scrape_url_content(url):
+# Extracted text is kept per URL with its ETag/Last-Modified validators; later
+# scrapes send a conditional GET and reuse the text on 304 Not Modified.
+scrape_cache = LRUTTLCache(
+    maxsize=int(os.getenv("SCRAPE_CACHE_SIZE", "2048")),
+    ttl=int(os.getenv("SCRAPE_CACHE_MAX_AGE", "86400")),
+    db_path=os.getenv("SCRAPE_CACHE_DB") or None,
+    name="scrape_cache",
+)
+
+
+def is_html_response(response):
+    content_type = response.headers.get("Content-Type", "")
+    return not content_type or content_type.split(";")[0].strip().lower() in HTML_CONTENT_TYPES
+
+
+def response_charset(response):
+    # The Content-Type charset, or None when the header does not declare one
+    for param in response.headers.get("Content-Type", "").split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset" and value.strip():
+            try:
+                return codecs.lookup(value.strip().strip('"')).name
+            except LookupError:
+                break
+    return None
+
+
+def conditional_headers(cached):
+    headers = {}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+    return headers
+
+
+def remember_page(url, response, text):
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if response.status_code == 200 and (etag or last_modified):
+        scrape_cache.set(url, {"text": text, "etag": etag, "last_modified": last_modified})
+
+
+async def scrape_url_content_async(url):
     try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        paragraphs = soup.find_all('p')
-        return ' '.join([p.get_text() for p in paragraphs])[:2500]
+        cached = scrape_cache.get(url)
+        headers = conditional_headers(cached)
+        async with host_slot(url):
+            async with get_async_client().stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and cached:
+                    scrape_cache.set(url, cached)
+                    return cached["text"]
+                if not is_html_response(response):
+                    print(f"Skipping {url}: not HTML ({response.headers.get('Content-Type')})")
+                    return ""
+                parse_in_pool = SCRAPE_PARSE_IN_POOL and cpu_pool.enabled
+                if parse_in_pool:
+                    # Parse in the process pool: download up to the byte cap, then hand it over
+                    body = bytearray()
+                    async for chunk in response.aiter_bytes(SCRAPE_CHUNK_SIZE):
+                        body += chunk[:SCRAPE_MAX_BYTES - len(body)]
+                        if len(body) >= SCRAPE_MAX_BYTES:
+                            break
+                else:
+                    # Parsing a chunk can block for milliseconds (far longer with
+                    # html.parser), so the reader runs in a worker thread
+                    reader = PageTextReader(response_charset(response), MAX_SCRAPE_CHARS, SCRAPE_MAX_BYTES)
+                    async for chunk in response.aiter_bytes(SCRAPE_CHUNK_SIZE):
+                        if await asyncio.to_thread(reader.feed, chunk):
+                            break
+        if parse_in_pool:
+            text = await cpu_pool.run(extract_page_text, bytes(body), response_charset(response), MAX_SCRAPE_CHARS)
+        else:
+            text = await asyncio.to_thread(reader.text)
+        remember_page(url, response, text)
+        return text
     except Exception as e:
         print(f"Error scraping {url}: {e}")
         return ""
@@ -53,51 +292,91 @@ def get_text_from_image(image_bytes):
         print(f"OCR error: {e}")
         return None
 
-# --- Intent Recognition ---
-def recognize_intent(user_input):
-    greetings = ['hello', 'hi', 'vanakkam', 'hai', 'good morning', 'good evening']
-    if user_input.strip().lower() in greetings:
-        return "greeting"
 
-    if not GEMINI_API_KEY:
-        return "fact_checking_claim"  # fallback
+async def get_text_from_image_async(image_bytes):
+    return await cpu_pool.run(get_text_from_image, image_bytes)
+
 
+# --- Evidence gathering (all sources of a claim fetched concurrently) ---
+async def gather_evidence_async(search_results):
+    tasks = [asyncio.create_task(scrape_url_content_async(r["link"])) for r in search_results]
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
-        prompt = f"""
+        done, pending = await asyncio.wait(tasks, timeout=SCRAPE_DEADLINE)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+    for task in pending:
+        task.cancel()
+    kept = [(r, t.result()) for r, t in zip(search_results, tasks) if t in done]
+    if pending:
+        print(f"⚠ Dropped {len(pending)} slow source(s) after {SCRAPE_DEADLINE}s")
+    return [r for r, _ in kept], [c for _, c in kept]
+
+# --- Intent Recognition ---
+# Confident local predictions skip the Gemini round-trip; None when no model file exists
+intent_classifier = load_intent_classifier()
+GREETINGS = ['hello', 'hi', 'vanakkam', 'hai', 'good morning', 'good evening']
+
+
+def is_greeting(user_input):
+    return user_input.strip().lower() in GREETINGS
+
+
+def build_intent_prompt(user_input):
+    return f"""
         Analyze the user input and classify it into:
         1. fact_checking_claim
         2. general_question
         User Input: "{user_input}"
         Category:
         """
-        response = model.generate_content(prompt)
-        intent = response.text.strip().lower().replace('"', "")
-        return 'fact_checking_claim' if 'fact_checking_claim' in intent else 'general_question'
+
+
+def parse_intent(response_text):
+    intent = response_text.strip().lower().replace('"', "")
+    return 'fact_checking_claim' if 'fact_checking_claim' in intent else 'general_question'
+
+
+def classify_intent_locally(user_input):
+    return intent_classifier.classify(user_input) if intent_classifier else None
+
+
+async def recognize_intent_async(user_input):
+    if is_greeting(user_input):
+        return "greeting"
+
+    local_intent = classify_intent_locally(user_input)
+    if local_intent:
+        return local_intent
+
+    if not GEMINI_API_KEY:
+        return "fact_checking_claim"  # fallback
+
+    try:
+        model = get_generative_model()
+        response = await model.generate_content_async(build_intent_prompt(user_input))
+        return parse_intent(response.text)
     except Exception as e:
         print(f"Intent recognition error: {e}")
         return "fact_checking_claim"
 
 # --- Fact-Checking ---
-def verify_misinformation(claim):
-    search_results = search_the_web_google(claim)
-    if not search_results:
-        return "Error: Could not fetch search results. Check API keys or quota."
+NO_SEARCH_RESULTS = "Error: Could not fetch search results. Check API keys or quota."
+NO_GEMINI_KEY = "Google search fetched content, but Gemini API key missing for analysis."
 
+
+def build_context(search_results, contents):
     context, sources = "", []
-    for i, result in enumerate(search_results):
+    for i, (result, content) in enumerate(zip(search_results, contents)):
         url = result.get("link")
-        if url:
-            content = scrape_url_content(url)
-            context += f"Source [{i+1}]: {result.get('title')}\nURL: {url}\nContent: {content}\n\n"
-            sources.append(url)
+        context += f"Source [{i+1}]: {result.get('title')}\nURL: {url}\nContent: {content}\n\n"
+        sources.append(url)
+    return context, sources
 
-    if not GEMINI_API_KEY:
-        return "Google search fetched content, but Gemini API key missing for analysis."
 
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
-        prompt = f"""
+def build_verdict_prompt(claim, context, sources):
+    return f"""
         You are a multilingual Misinformation Analyst.
         USER CLAIM: "{claim}"
         CONTEXT: {context}
@@ -105,29 +384,211 @@ def verify_misinformation(claim):
         1.Analyze the language of the *USER'S CLAIM.SPECIAL RULE:If the text is in the Roman alphabet,you MUST assume the language is **ENGLISH*
         2. Analyze context and give verdict.
         3. Report format: "Verdict: [Factually True/False/Misleading/Unverified]"
+        4. End the report with "Confidence: [0.00-1.00]"
         Sources: {sources[:3]}
         """
-        response = model.generate_content(prompt)
-        return response.text
+
+
+VERDICT_PATTERN = re.compile(r"Verdict:\W*(?:Factually\s+)?(True|False|Misleading|Unverified)", re.IGNORECASE)
+CONFIDENCE_PATTERN = re.compile(r"Confidence:\W*([01](?:\.\d+)?)", re.IGNORECASE)
+VERDICT_LABELS = {"true": "true", "false": "false", "misleading": "false", "unverified": "unknown"}
+
+
+@dataclass
+class FactCheckResult:
+    claim: str
+    report: str = ""
+    label: Optional[str] = None       # verdict as written in the report, e.g. "misleading"
+    verdict: Optional[str] = None     # result.verdict enum; None when no analysis was produced
+    confidence: Optional[float] = None
+    sources: list = field(default_factory=list)
+    model_version: Optional[str] = None
+    stage_ms: dict = field(default_factory=dict)
+    latency_ms: int = 0
+
+
+def elapsed_ms(started):
+    return int((time.perf_counter() - started) * 1000)
+
+
+def apply_report(result, report):
+    # Maps the report's verdict line onto the result/final_decision verdict enum
+    result.report = report
+    result.model_version = GEMINI_MODEL_NAME
+    match = VERDICT_PATTERN.search(report or "")
+    result.label = match.group(1).lower() if match else None
+    result.verdict = VERDICT_LABELS[result.label] if match else "unknown"
+    match = CONFIDENCE_PATTERN.search(report or "")
+    result.confidence = min(float(match.group(1)), 1.0) if match else None
+
+
+async def collect_evidence_async(claim):
+    # Search + scrape stages; returns ((context, sources) or None, stage_ms, started)
+    started = time.perf_counter()
+    stage_ms = {}
+
+    stage = time.perf_counter()
+    search_results = await search_the_web_google_async(claim)
+    stage_ms["search"] = elapsed_ms(stage)
+    if not search_results:
+        return None, stage_ms, started
+
+    stage = time.perf_counter()
+    search_results = [r for r in search_results if r.get("link")]
+    search_results, contents = await gather_evidence_async(search_results)
+    evidence = build_context(search_results, contents)
+    stage_ms["scrape"] = elapsed_ms(stage)
+    return evidence, stage_ms, started
+
+
+async def prepare_verdict_async(claim, evidence_task=None):
+    # Evidence stage shared by both handlers; evidence_task is a
+    # collect_evidence_async task already started speculatively. Returns
+    # (result, context, started); context is None when result is already final.
+    evidence, stage_ms, started = await (evidence_task or collect_evidence_async(claim))
+    result = FactCheckResult(claim=claim, stage_ms=stage_ms)
+    if evidence is None:
+        result.report = NO_SEARCH_RESULTS
+    else:
+        context, result.sources = evidence
+        if GEMINI_API_KEY:
+            return result, context, started
+        result.report = NO_GEMINI_KEY
+    result.latency_ms = elapsed_ms(started)
+    return result, None, started
+
+
+async def verify_misinformation_async(claim, evidence_task=None):
+    result, context, started = await prepare_verdict_async(claim, evidence_task)
+    if context is None:
+        return result
+
+    stage = time.perf_counter()
+    try:
+        model = get_generative_model()
+        response = await model.generate_content_async(build_verdict_prompt(claim, context, result.sources))
+        apply_report(result, response.text)
     except Exception as e:
-        return f"Gemini analysis error: {e}"
+        result.report = f"Gemini analysis error: {e}"
+    result.stage_ms["llm"] = elapsed_ms(stage)
+    result.latency_ms = elapsed_ms(started)
+    return result
 
 # --- Main Handler ---
-def freaksearch_handler(user_input, image_bytes=None):
+# "speculative" starts search + scraping alongside intent detection when the local
+# classifier is unsure, and cancels them if the input is not a claim
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "sequential")
+GREETING_REPLY = "Hello! I am FreakSearch. Provide a claim to verify."
+OFF_TOPIC_REPLY = "I am FreakSearch. I only verify news claims."
+
+
+async def detect_intent_async(text):
+    # Returns (intent, evidence_task); the task is only set for claims in speculative mode
+    evidence_task = None
+    if PIPELINE_MODE == "speculative" and not classify_intent_locally(text):
+        evidence_task = asyncio.create_task(collect_evidence_async(text))
+
+    try:
+        intent = await recognize_intent_async(text)
+    except BaseException:
+        if evidence_task:
+            evidence_task.cancel()
+        raise
+    if intent != "fact_checking_claim" and evidence_task:
+        evidence_task.cancel()
+        evidence_task = None
+    return intent, evidence_task
+
+
+async def route_input_async(user_input, image_bytes=None):
+    # Steps shared by both handlers before a new verdict: OCR, empty input,
+    # greeting, verdict cache, semantic cache and intent. Returns
+    # (text, reply, evidence_task); reply is the final "done" payload when the
+    # input needs no fact-check, and carries cached=True for cache hits.
     if image_bytes:
-        text = get_text_from_image(image_bytes)
+        text = await get_text_from_image_async(image_bytes)
         if not text:
-            return "Error: No text read from image."
+            return None, {"text": "Error: No text read from image."}, None
     else:
         text = user_input
 
     if not text:
-        return "Error: No input provided."
+        return None, {"text": "Error: No input provided."}, None
+
+    if is_greeting(text):
+        return text, {"text": GREETING_REPLY}, None
+
+    cached = await run_db(get_cached_verdict, text)
+    if cached:
+        return text, {"text": cached, "cached": True}, None
+    similar = await asyncio.to_thread(semantic_cache.lookup, text)
+    if similar:
+        reply = {"text": similar["report"], "verdict": similar["verdict"], "sources": similar["sources"], "cached": True}
+        return text, reply, None
 
-    intent = recognize_intent(text)
+    intent, evidence_task = await detect_intent_async(text)
     if intent == "greeting":
-        return "Hello! I am FreakSearch. Provide a claim to verify."
-    elif intent == "fact_checking_claim":
-        return verify_misinformation(text)
-    else:
-        return "I am FreakSearch. I only verify news claims."
+        return text, {"text": GREETING_REPLY}, None
+    elif intent != "fact_checking_claim":
+        return text, {"text": OFF_TOPIC_REPLY}, None
+    return text, None, evidence_task
+
+
+async def save_result_async(result):
+    if result.verdict:
+        await run_db(store_result, result)
+        await asyncio.to_thread(semantic_cache.add, result)
+
+
+async def freaksearch_handler_async(user_input, image_bytes=None):
+    text, reply, evidence_task = await route_input_async(user_input, image_bytes)
+    if reply:
+        return reply["text"]
+    result = await verify_misinformation_async(text, evidence_task)
+    await save_result_async(result)
+    return result.report
+
+
+# --- Streaming handler (Server-Sent Events) ---
+# Yields (event, data) pairs: "status" progress updates, "token" chunks of the
+# report as Gemini generates it, and a final "done" with the full text.
+async def freaksearch_stream(user_input, image_bytes=None):
+    text, reply, evidence_task = await route_input_async(user_input, image_bytes)
+    if reply:
+        if reply.get("cached"):
+            yield "token", {"text": reply["text"]}
+        yield "done", reply
+        return
+
+    try:
+        yield "status", {"stage": "searching"}
+        result, context, started = await prepare_verdict_async(text, evidence_task)
+    finally:
+        # The client can disconnect at the yield above; don't leave a speculative
+        # search and its scrapes running orphaned
+        if evidence_task and not evidence_task.done():
+            evidence_task.cancel()
+    if context is None:
+        yield "done", {"text": result.report}
+        return
+    yield "status", {"stage": "scraped", "sources": len(result.sources)}
+
+    yield "status", {"stage": "analyzing"}
+    stage = time.perf_counter()
+    report = ""
+    try:
+        response = await get_generative_model().generate_content_async(
+            build_verdict_prompt(text, context, result.sources), stream=True
+        )
+        async for chunk in response:
+            report += chunk.text
+            yield "token", {"text": chunk.text}
+        apply_report(result, report)
+    except Exception as e:
+        result.report = f"Gemini analysis error: {e}"
+        yield "token", {"text": result.report}
+    result.stage_ms["llm"] = elapsed_ms(stage)
+    result.latency_ms = elapsed_ms(started)
+
+    await save_result_async(result)
+    yield "done", {"text": result.report, "verdict": result.verdict, "sources": result.sources}
@@ -0,0 +1,328 @@
+# backend/repository.py
+
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from db import get_db_connection, saved_chat_hash, DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW
+
+
+class DatabaseUnavailable(Exception):
+    pass
+
+
+# --- DB thread pool ---
+# mysql-connector is blocking, so every query runs on one of these threads (one
+# per pooled connection) and the event loop only awaits the result.
+db_executor = ThreadPoolExecutor(
+    max_workers=DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW, thread_name_prefix="db"
+)
+
+
+async def run_db(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(db_executor, fn, *args)
+
+
+def _execute(query, params, fetch):
+    conn = get_db_connection()
+    if not conn:
+        raise DatabaseUnavailable("Database connection failed.")
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+        if fetch == "one":
+            return cursor.fetchone()
+        if fetch == "all":
+            return cursor.fetchall()
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+async def fetch_one(query, params=()):
+    return await run_db(_execute, query, params, "one")
+
+
+async def fetch_all(query, params=()):
+    return await run_db(_execute, query, params, "all")
+
+
+async def execute(query, params=()):
+    return await run_db(_execute, query, params, None)
+
+
+def _execute_many(query, rows):
+    conn = get_db_connection()
+    if not conn:
+        raise DatabaseUnavailable("Database connection failed.")
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(query, rows)  # rewritten into one multi-row INSERT
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def execute_many(query, rows):
+    return await run_db(_execute_many, query, rows)
+
+
+# --- users ---
+async def find_user_by_username(username):
+    return await fetch_one("SELECT * FROM users WHERE username = %s", (username,))
+
+
+async def user_exists(username, email):
+    row = await fetch_one(
+        "SELECT user_id FROM users WHERE username = %s OR email = %s LIMIT 1", (username, email)
+    )
+    return row is not None
+
+
+async def create_user(username, password_hash, email, full_name):
+    return await execute(
+        "INSERT INTO users (username, password_hash, email, full_name, status) VALUES (%s, %s, %s, %s, %s)",
+        (username, password_hash, email, full_name, "active")
+    )
+
+
+# --- submission ---
+async def list_submission_previews(user_id, before_id, limit):
+    # Keyset pagination on id: callers pass the last id they saw as before_id.
+    # Only indexed columns are read (idx_submission_user_history), never input_text.
+    if before_id is None:
+        return await fetch_all(
+            "SELECT id, input_preview AS preview FROM submission "
+            "WHERE user_id = %s ORDER BY id DESC LIMIT %s",
+            (user_id, limit)
+        )
+    return await fetch_all(
+        "SELECT id, input_preview AS preview FROM submission "
+        "WHERE user_id = %s AND id < %s ORDER BY id DESC LIMIT %s",
+        (user_id, before_id, limit)
+    )
+
+
+async def get_submission(user_id, submission_id):
+    return await fetch_one(
+        "SELECT id, input_text, created_at FROM submission WHERE id = %s AND user_id = %s",
+        (submission_id, user_id)
+    )
+
+
+# Saving the same chat twice returns the existing row, which also makes a
+# retried write-behind batch idempotent
+INSERT_SUBMISSION = (
+    "INSERT INTO submission (user_id, input_type, input_text, content_hash) VALUES (%s, 'text', %s, %s) "
+    "ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)"
+)
+
+
+async def create_submission(user_id, input_text):
+    return await execute(INSERT_SUBMISSION, (user_id, input_text, saved_chat_hash(user_id, input_text)))
+
+
+# --- submission write-behind ---
+# With SAVE_WRITE_BEHIND=1, saved chats are queued in memory and written as
+# multi-row INSERTs every SAVE_FLUSH_INTERVAL_MS or SAVE_FLUSH_MAX_ROWS rows,
+# whichever comes first. The queue is flushed on graceful shutdown. When it
+# holds SAVE_QUEUE_MAX rows, saves fall back to a direct INSERT.
+# A failed batch is retried row by row so one bad row cannot block the rest;
+# rows that keep failing are retried with exponential backoff and, after
+# SAVE_MAX_ATTEMPTS (or at shutdown), appended to the SAVE_DEAD_LETTER file.
+SAVE_WRITE_BEHIND = os.getenv("SAVE_WRITE_BEHIND", "0") == "1"
+SAVE_FLUSH_INTERVAL_MS = int(os.getenv("SAVE_FLUSH_INTERVAL_MS", "200"))
+SAVE_FLUSH_MAX_ROWS = int(os.getenv("SAVE_FLUSH_MAX_ROWS", "500"))
+SAVE_QUEUE_MAX = int(os.getenv("SAVE_QUEUE_MAX", "50000"))
+SAVE_MAX_ATTEMPTS = int(os.getenv("SAVE_MAX_ATTEMPTS", "5"))
+SAVE_RETRY_BACKOFF = float(os.getenv("SAVE_RETRY_BACKOFF", "1"))  # seconds, doubled per attempt
+SAVE_RETRY_BACKOFF_MAX = float(os.getenv("SAVE_RETRY_BACKOFF_MAX", "60"))
+SAVE_DEAD_LETTER = os.getenv("SAVE_DEAD_LETTER", "submission_dead_letter.jsonl")
+
+
+@dataclass
+class QueuedSubmission:
+    user_id: int
+    input_text: str
+    attempts: int = 0
+    retry_at: float = 0.0
+
+    @property
+    def params(self):
+        return (self.user_id, self.input_text, saved_chat_hash(self.user_id, self.input_text))
+
+
+class SubmissionWriter:
+    def __init__(self, interval_ms, max_rows, max_queue, max_attempts=SAVE_MAX_ATTEMPTS,
+                 backoff=SAVE_RETRY_BACKOFF, dead_letter_path=SAVE_DEAD_LETTER):
+        self.interval = interval_ms / 1000
+        self.max_rows = max_rows
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.dead_letter_path = dead_letter_path
+        self.queued = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+        self.retried_rows = 0
+        self.dead_lettered = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._pending = []
+        self._retry = []  # rows that failed on their own, waiting for retry_at
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(final=True)
+
+    def enqueue(self, user_id, input_text):
+        if len(self._pending) + len(self._retry) >= self.max_queue:
+            return False
+        self._pending.append(QueuedSubmission(user_id, input_text))
+        self.queued += 1
+        if len(self._pending) >= self.max_rows:
+            self._wakeup.set()
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self, final=False):
+        # final: retry every failed row once more and dead-letter what still fails
+        async with self._flush_lock:
+            now = time.monotonic()
+            due, waiting = [], []
+            for row in self._retry:
+                (due if final or row.retry_at <= now else waiting).append(row)
+            self._retry = waiting
+
+            while self._pending:
+                batch = self._pending[:self.max_rows]
+                del self._pending[:len(batch)]
+                started = time.perf_counter()
+                try:
+                    await execute_many(INSERT_SUBMISSION, [row.params for row in batch])
+                except Exception as e:
+                    print(f"❌ Submission flush error, retrying {len(batch)} rows one by one: {e}")
+                    self.failed_flushes += 1
+                    for row in batch:
+                        await self._write_row(row, final)
+                    continue
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.flushes += 1
+                self.flushed_rows += len(batch)
+                self.last_flush_ms = round(elapsed_ms, 2)
+                self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+
+            for row in due:
+                self.retried_rows += 1
+                await self._write_row(row, final)
+
+    async def _write_row(self, row, final):
+        try:
+            await execute(INSERT_SUBMISSION, row.params)
+        except Exception as e:
+            row.attempts += 1
+            if final or row.attempts >= self.max_attempts:
+                self._dead_letter(row, e)
+            else:
+                delay = min(self.backoff * 2 ** (row.attempts - 1), SAVE_RETRY_BACKOFF_MAX)
+                row.retry_at = time.monotonic() + delay
+                self._retry.append(row)
+            return
+        self.flushed_rows += 1
+
+    def _dead_letter(self, row, error):
+        self.dead_lettered += 1
+        print(f"❌ Submission for user {row.user_id} failed {row.attempts} times, written to {self.dead_letter_path}: {error}")
+        record = {
+            "user_id": row.user_id,
+            "input_text": row.input_text,
+            "attempts": row.attempts,
+            "error": str(error),
+            "failed_at": time.time(),
+        }
+        try:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"❌ Could not write dead-letter record: {e}")
+
+    def stats(self):
+        return {
+            "enabled": self.running,
+            "queue_depth": len(self._pending),
+            "retry_depth": len(self._retry),
+            "queued": self.queued,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_flushes": self.failed_flushes,
+            "retried_rows": self.retried_rows,
+            "dead_lettered": self.dead_lettered,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+        }
+
+
+submission_writer = SubmissionWriter(SAVE_FLUSH_INTERVAL_MS, SAVE_FLUSH_MAX_ROWS, SAVE_QUEUE_MAX)
+
+
+# --- result ---
+async def list_results(submission_id):
+    return await fetch_all(
+        "SELECT * FROM result WHERE submission_id = %s ORDER BY id", (submission_id,)
+    )
+
+
+async def create_result(submission_id, source, verdict, confidence=None, explanation=None,
+                        citations=None, raw=None, model_version=None, latency_ms=None):
+    return await execute(
+        "INSERT INTO result (submission_id, source, verdict, confidence, explanation, citations, raw, "
+        "model_version, latency_ms) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+        (submission_id, source, verdict, confidence, explanation,
+         json.dumps(citations) if citations is not None else None,
+         json.dumps(raw) if raw is not None else None,
+         model_version, latency_ms)
+    )
+
+
+# --- feedback ---
+async def list_feedback(submission_id):
+    return await fetch_all(
+        "SELECT * FROM feedback WHERE submission_id = %s ORDER BY created_at DESC", (submission_id,)
+    )
+
+
+async def create_feedback(submission_id, label, label_source="human", notes=None):
+    return await execute(
+        "INSERT INTO feedback (submission_id, label, label_source, notes) VALUES (%s, %s, %s, %s)",
+        (submission_id, label, label_source, notes)
+    )
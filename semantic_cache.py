@@ -0,0 +1,333 @@
+# backend/semantic_cache.py
+
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import numpy as np
+    import hnswlib
+    from fastembed import TextEmbedding
+except ImportError:
+    np = hnswlib = TextEmbedding = None
+
+from db import normalize_claim, VERDICT_CACHE_TTLS
+
+# --- Semantic verdict cache ---
+# Reworded variants of an already verified claim reuse its report. Claims are
+# embedded with a small local ONNX model (fastembed) and looked up in an HNSW
+# index (hnswlib), which stays at well under a millisecond per query at millions
+# of entries. Reports, sources and the embeddings themselves live in a SQLite
+# file next to the index; every worker pulls rows it has not indexed yet before
+# each lookup, so several uvicorn workers share one cache.
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "on")  # "off" disables it
+SEMANTIC_CACHE_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "BAAI/bge-small-en-v1.5")
+# Cosine similarity a neighbour needs to count as the same claim. Keep this high:
+# a negated claim can embed very close to the original.
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", "semantic_cache")
+SEMANTIC_CACHE_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "100000"))  # grows by doubling
+SEMANTIC_CACHE_EF = int(os.getenv("SEMANTIC_CACHE_EF", "64"))
+# Index snapshots are written by a background thread once the newest snapshot on
+# disk (from any worker) is SEMANTIC_CACHE_SAVE_ROWS rows behind, or behind at
+# all and older than SEMANTIC_CACHE_SAVE_INTERVAL seconds. Rows missing from a
+# snapshot are re-indexed from SQLite on load, so snapshots can be infrequent.
+SEMANTIC_CACHE_SAVE_ROWS = int(os.getenv("SEMANTIC_CACHE_SAVE_ROWS", "10000"))
+SEMANTIC_CACHE_SAVE_INTERVAL = float(os.getenv("SEMANTIC_CACHE_SAVE_INTERVAL", "600"))
+SAVE_CHECK_INTERVAL = 5
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+NEIGHBOURS = 4
+
+
+class IndexLock:
+    # Queries and snapshots share the index; syncs, deletes and resizes need it to
+    # themselves. Changes are skipped rather than queued while a snapshot is being
+    # written (the rows stay in SQLite and are indexed by the next sync), so a
+    # long snapshot never blocks a lookup.
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+        self._snapshotting = False
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                self._cond.notify_all()
+
+    def acquire_exclusive(self):
+        with self._cond:
+            if self._snapshotting:
+                return False
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+            return True
+
+    def release_exclusive(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def snapshot(self):
+        with self._cond:
+            self._snapshotting = True
+        try:
+            with self.shared():
+                yield
+        finally:
+            with self._cond:
+                self._snapshotting = False
+
+
+class SemanticCache:
+    def __init__(self, path, model_name, threshold, capacity):
+        self.path = path
+        self.model_name = model_name
+        self.threshold = threshold
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.snapshots = 0
+        self.last_snapshot_ms = 0.0
+        self._model = None
+        self._index = None
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._lock = IndexLock()
+        self._synced_id = 0  # every row up to this id is in the index
+        self._saver = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self):
+        return self._index is not None
+
+    def start(self):
+        # Loads the embedding model and index; a few seconds, so call it at startup
+        if SEMANTIC_CACHE == "off" or self.enabled:
+            return
+        if TextEmbedding is None:
+            print("⚠ fastembed/hnswlib/numpy not installed. Semantic verdict cache disabled.")
+            return
+        try:
+            self._model = TextEmbedding(model_name=self.model_name)
+            dim = len(self.embed("warm up"))
+
+            self._db = sqlite3.connect(f"{self.path}.db", timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS semantic_cache ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, model TEXT NOT NULL, verdict TEXT NOT NULL, "
+                "report TEXT NOT NULL, sources TEXT NOT NULL, embedding BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._index = self._load_index(dim)
+            self._index.set_ef(SEMANTIC_CACHE_EF)
+            self._sync()
+        except Exception as e:
+            print(f"⚠ Semantic verdict cache disabled: {e}")
+            self._index = None
+            return
+        self._stop.clear()
+        self._saver = threading.Thread(target=self._run_saver, name="semantic-cache-saver", daemon=True)
+        self._saver.start()
+
+    def _load_index(self, dim):
+        # Falls back to an empty index (rebuilt from the stored embeddings) if the
+        # saved one is missing, from another model, or replaced mid-load
+        try:
+            meta = self._read_meta()
+            if meta["model"] == self.model_name:
+                index = hnswlib.Index(space="cosine", dim=dim)
+                index.load_index(meta["file"], max_elements=max(self.capacity, meta["count"]))
+                self._synced_id = meta["synced_id"]
+                return index
+        except (OSError, ValueError, KeyError, RuntimeError):
+            pass
+        self._synced_id = 0
+        index = hnswlib.Index(space="cosine", dim=dim)
+        index.init_index(max_elements=self.capacity, ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+        return index
+
+    def _read_meta(self):
+        with open(f"{self.path}.json") as f:
+            return json.load(f)
+
+    def embed(self, text):
+        return next(iter(self._model.embed([normalize_claim(text)]))).astype(np.float32)
+
+    def _query_db(self, query, params=()):
+        with self._db_lock:
+            return self._db.execute(query, params).fetchall()
+
+    def _sync(self):
+        # Indexes rows added by this or any other worker since the last sync
+        new_rows = "SELECT {} FROM semantic_cache WHERE id > ? AND model = ? ORDER BY id"
+        if not self._query_db(new_rows.format("id") + " LIMIT 1", (self._synced_id, self.model_name)):
+            return
+        if not self._lock.acquire_exclusive():
+            return
+        try:
+            rows = self._query_db(new_rows.format("id, embedding"), (self._synced_id, self.model_name))
+            if not rows:
+                return
+            needed = self._index.get_current_count() + len(rows)
+            if needed > self._index.get_max_elements():
+                self._index.resize_index(max(needed, self._index.get_max_elements() * 2))
+            ids = np.array([row[0] for row in rows])
+            vectors = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            self._index.add_items(vectors, ids)
+            self._synced_id = rows[-1][0]
+        finally:
+            self._lock.release_exclusive()
+
+    def lookup(self, claim):
+        # Returns {"report", "verdict", "sources", "similarity"} or None
+        if not self.enabled:
+            return None
+        vector = self.embed(claim)
+        now = time.time()
+        self._sync()
+        with self._lock.shared():
+            count = self._index.get_current_count()
+            try:
+                labels, distances = self._index.knn_query(vector, k=min(NEIGHBOURS, count)) if count else ([[]], [[]])
+            except RuntimeError:  # fewer live entries than k
+                labels, distances = [[]], [[]]
+
+        for label, distance in zip(labels[0], distances[0]):
+            similarity = 1.0 - float(distance)
+            if similarity < self.threshold:
+                break
+            rows = self._query_db(
+                "SELECT verdict, report, sources, created_at FROM semantic_cache WHERE id = ?", (int(label),)
+            )
+            if rows and now - rows[0][3] <= VERDICT_CACHE_TTLS.get(rows[0][0], 0):
+                self.hits += 1
+                return {
+                    "report": rows[0][1],
+                    "verdict": rows[0][0],
+                    "sources": json.loads(rows[0][2]),
+                    "similarity": round(similarity, 4),
+                }
+            self._forget(int(label))
+        self.misses += 1
+        return None
+
+    def _forget(self, label):
+        # Expired (or deleted by another worker): drop it from the table, and from
+        # the index unless a snapshot is being written (then a later lookup will)
+        self._query_db("DELETE FROM semantic_cache WHERE id = ?", (label,))
+        if not self._lock.acquire_exclusive():
+            return
+        try:
+            self._index.mark_deleted(label)
+        except RuntimeError:
+            pass
+        finally:
+            self._lock.release_exclusive()
+
+    def add(self, result):
+        # result: a FactCheckResult with a verdict
+        if not self.enabled or not result.verdict:
+            return
+        vector = self.embed(result.claim)
+        self._query_db(
+            "INSERT INTO semantic_cache (model, verdict, report, sources, embedding, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (self.model_name, result.verdict, result.report, json.dumps(result.sources), vector.tobytes(), time.time())
+        )
+        self._sync()
+
+    def _run_saver(self):
+        while not self._stop.wait(SAVE_CHECK_INTERVAL):
+            try:
+                if self._snapshot_due():
+                    self._save()
+            except Exception as e:
+                print(f"⚠ Semantic cache snapshot failed: {e}")
+
+    def _snapshot_due(self):
+        # Compares against the newest snapshot of any worker, so workers sharing
+        # the cache do not all write the same snapshot
+        try:
+            meta = self._read_meta()
+            saved_id = meta["synced_id"] if meta["model"] == self.model_name else 0
+            age = time.time() - os.path.getmtime(f"{self.path}.json")
+        except (OSError, ValueError, KeyError):
+            saved_id, age = 0, float("inf")
+        behind = self._synced_id - saved_id
+        return behind >= SEMANTIC_CACHE_SAVE_ROWS or (behind > 0 and age >= SEMANTIC_CACHE_SAVE_INTERVAL)
+
+    def _save(self):
+        # Each snapshot gets its own file named after its watermark and the JSON
+        # pointer is swapped atomically, so workers saving at once never pair one
+        # worker's index with another's watermark
+        started = time.perf_counter()
+        with self._lock.snapshot():
+            synced_id = self._synced_id
+            count = self._index.get_current_count()
+            index_file = f"{self.path}.{synced_id}.hnsw"
+            self._index.save_index(f"{index_file}.{os.getpid()}.tmp")
+        os.replace(f"{index_file}.{os.getpid()}.tmp", index_file)
+        meta = {"model": self.model_name, "file": index_file, "synced_id": synced_id, "count": count}
+        with open(f"{self.path}.json.{os.getpid()}.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(f"{self.path}.json.{os.getpid()}.tmp", f"{self.path}.json")
+        for old_file in glob.glob(f"{glob.escape(self.path)}.*.hnsw"):
+            if old_file != index_file:
+                try:
+                    os.remove(old_file)
+                except OSError:
+                    pass
+        self.snapshots += 1
+        self.last_snapshot_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    def close(self):
+        if not self.enabled:
+            return
+        self._stop.set()
+        self._saver.join()
+        if self._snapshot_due():
+            self._save()
+        with self._db_lock:
+            self._db.close()
+        self._index = None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": self._index.get_current_count() if self.enabled else 0,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "snapshots": self.snapshots,
+            "last_snapshot_ms": self.last_snapshot_ms,
+        }
+
+
+semantic_cache = SemanticCache(
+    path=SEMANTIC_CACHE_PATH,
+    model_name=SEMANTIC_CACHE_MODEL,
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    capacity=SEMANTIC_CACHE_CAPACITY,
+)
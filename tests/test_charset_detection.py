@@ -0,0 +1,79 @@
+# tests/test_charset_detection.py
+#
+# Charset precedence for scraped pages (BOM, then the Content-Type charset,
+# then <meta charset>) and PageTextReader's sniff-then-decode buffering.
+#
+#   python -m unittest discover tests
+
+import codecs
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from extraction import PageTextReader, SNIFF_BYTES, detect_charset
+
+RUSSIAN = "Проверка фактов: заявление не подтверждено"
+
+
+def read_page(body, declared=None, chunk_size=512):
+    reader = PageTextReader(declared, limit=10000, max_bytes=2 * 1024 * 1024)
+    for start in range(0, len(body), chunk_size):
+        if reader.feed(body[start:start + chunk_size]):
+            break
+    return reader.text()
+
+
+class DetectCharsetTest(unittest.TestCase):
+    def test_bom_wins_over_a_conflicting_header(self):
+        self.assertEqual(detect_charset(codecs.BOM_UTF8 + b"<p>x</p>", "cp1252"), "utf-8-sig")
+        self.assertEqual(detect_charset(codecs.BOM_UTF16_LE + "<p>".encode("utf-16-le"), "utf-8"), "utf-16")
+
+    def test_header_wins_over_meta(self):
+        head = b'<meta charset="windows-1251"><p>x</p>'
+        self.assertEqual(detect_charset(head, "utf-8"), "utf-8")
+        self.assertEqual(detect_charset(head), "cp1251")
+
+    def test_latin1_and_ascii_meta_map_to_cp1252(self):
+        for name in (b"iso-8859-1", b"latin1", b"us-ascii"):
+            head = b'<meta http-equiv="Content-Type" content="text/html; charset=' + name + b'">'
+            self.assertEqual(detect_charset(head), "cp1252")
+
+    def test_unknown_or_utf16_meta_falls_back_to_utf8(self):
+        self.assertEqual(detect_charset(b'<meta charset="no-such-charset">'), "utf-8")
+        self.assertEqual(detect_charset(b'<meta charset="utf-16">'), "utf-8")
+        self.assertEqual(detect_charset(b"<p>no declaration</p>"), "utf-8")
+
+
+class PageTextReaderTest(unittest.TestCase):
+    def test_bom_body_with_conflicting_header(self):
+        body = codecs.BOM_UTF16_LE + f"<html><p>{RUSSIAN}</p></html>".encode("utf-16-le")
+        self.assertEqual(read_page(body, declared="cp1252"), RUSSIAN)
+
+    def test_meta_charset_after_the_first_chunk(self):
+        # The declaration arrives in a later chunk but inside SNIFF_BYTES; the
+        # bytes before it must not have been decoded as UTF-8 already
+        padding = "<!-- " + "x" * 1500 + " -->"
+        html = f'<html><head>{padding}<meta charset="windows-1251"></head><body><p>{RUSSIAN}</p></body></html>'
+        body = html.encode("cp1251")
+        self.assertLess(body.index(b"<meta"), SNIFF_BYTES)
+        self.assertGreater(body.index(b"<meta"), 512)
+        self.assertEqual(read_page(body, chunk_size=512), RUSSIAN)
+
+    def test_latin1_meta_decodes_cp1252_punctuation(self):
+        body = b'<meta charset="iso-8859-1"><p>\x93Quoted\x94 \x96 caf\xe9</p>'
+        self.assertEqual(read_page(body), "“Quoted” – café")
+
+    def test_body_shorter_than_sniff_bytes(self):
+        body = f'<meta charset="windows-1251"><p>{RUSSIAN}</p>'.encode("cp1251")
+        self.assertLess(len(body), SNIFF_BYTES)
+        reader = PageTextReader(limit=10000, max_bytes=2 * 1024 * 1024)
+        self.assertFalse(reader.feed(body))
+        self.assertEqual(reader.text(), RUSSIAN)
+
+    def test_empty_body(self):
+        self.assertEqual(PageTextReader().text(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+# tests/test_connection_pool.py
+#
+# db.ConnectionPool against a fake connect(): overflow and timeout limits,
+# recycling, health checks, and the open-connection count when connecting or
+# rolling back fails.
+#
+#   python -m unittest discover tests
+
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import db
+from db import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.connected = True
+        self.closed = False
+        self.rollback_fails = False
+
+    def is_connected(self):
+        return self.connected
+
+    def rollback(self):
+        if self.rollback_fails:
+            raise Exception("2013 Lost connection to MySQL server")
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.opened = []
+        self.connect_error = None
+        self.original_connect = db.connect
+        db.connect = self.fake_connect
+
+    def tearDown(self):
+        db.connect = self.original_connect
+
+    def fake_connect(self):
+        if self.connect_error:
+            raise self.connect_error
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+    def make_pool(self, size=1, max_overflow=1, timeout=0.05, recycle=1800):
+        return ConnectionPool(size, max_overflow, timeout, recycle)
+
+    def test_overflow_connections_are_closed_on_release(self):
+        pool = self.make_pool(size=1, max_overflow=1)
+        first, second = pool.checkout(), pool.checkout()
+        self.assertEqual(pool.stats()["open"], 2)
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+
+        first.close()
+        second.close()
+        stats = pool.stats()
+        self.assertEqual((stats["open"], stats["idle"], stats["in_use"]), (1, 1, 0))
+        self.assertEqual([conn.closed for conn in self.opened], [False, True])
+
+    def test_timeout_raises_and_waiters_get_released_connections(self):
+        pool = self.make_pool(size=1, max_overflow=0, timeout=0.05)
+        held = pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+        pool.timeout = 5
+        threading.Timer(0.05, held.close).start()
+        conn = pool.checkout()
+        self.assertIs(conn._conn, self.opened[0])
+        self.assertEqual(len(self.opened), 1)
+        self.assertGreaterEqual(pool.stats()["waits"], 1)
+
+    def test_old_connections_are_recycled(self):
+        pool = self.make_pool(recycle=60)
+        conn = pool.checkout()
+        conn._created_at -= 120
+        conn.close()
+
+        pool.checkout()
+        self.assertEqual(pool.stats()["recycled"], 1)
+        self.assertTrue(self.opened[0].closed)
+        self.assertEqual(len(self.opened), 2)
+        self.assertEqual(pool.stats()["open"], 1)
+
+    def test_failed_health_check_replaces_the_connection(self):
+        pool = self.make_pool()
+        pool.checkout().close()
+        self.opened[0].connected = False
+
+        conn = pool.checkout()
+        self.assertIs(conn._conn, self.opened[1])
+        self.assertTrue(self.opened[0].closed)
+        self.assertEqual(pool.stats()["failed_checks"], 1)
+        self.assertEqual(pool.stats()["open"], 1)
+
+    def test_connect_error_frees_the_slot(self):
+        pool = self.make_pool(size=1, max_overflow=0)
+        self.connect_error = db.Error("2003 Can't connect to MySQL server")
+        with self.assertRaises(db.Error):
+            pool.checkout()
+        self.assertEqual(pool.stats()["open"], 0)
+
+        self.connect_error = None
+        pool.checkout()
+        self.assertEqual(pool.stats()["open"], 1)
+
+    def test_release_discards_connection_when_rollback_fails(self):
+        pool = self.make_pool(size=1, max_overflow=0)
+        conn = pool.checkout()
+        self.opened[0].rollback_fails = True
+        conn.close()
+
+        stats = pool.stats()
+        self.assertEqual((stats["open"], stats["idle"], stats["in_use"]), (0, 0, 0))
+        self.assertTrue(self.opened[0].closed)
+        self.assertIsNot(pool.checkout()._conn, self.opened[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+# tests/test_submission_writer.py
+#
+# Write-behind queue for saved chats: a row the database rejects must not block
+# the rows queued after it, and must end up in the dead-letter file instead of
+# being dropped.
+#
+#   python -m unittest discover tests
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import repository
+from repository import SubmissionWriter
+
+BAD_TEXT = "row the database rejects"
+
+
+class FakeDatabase:
+    # Stands in for repository.execute/execute_many; any batch or row containing
+    # BAD_TEXT fails like a constraint violation
+    def __init__(self):
+        self.rows = []
+        self.batches = 0
+
+    async def execute_many(self, query, rows):
+        self.batches += 1
+        if any(row[1] == BAD_TEXT for row in rows):
+            raise Exception("1062 Duplicate entry")
+        self.rows.extend(rows)
+
+    async def execute(self, query, params=()):
+        if params[1] == BAD_TEXT:
+            raise Exception("1062 Duplicate entry")
+        self.rows.append(params)
+        return len(self.rows)
+
+
+class SubmissionWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.db = FakeDatabase()
+        self.originals = (repository.execute, repository.execute_many)
+        repository.execute = self.db.execute
+        repository.execute_many = self.db.execute_many
+        fd, self.dead_letter = tempfile.mkstemp(suffix=".jsonl")
+        os.close(fd)
+
+    def tearDown(self):
+        repository.execute, repository.execute_many = self.originals
+        os.remove(self.dead_letter)
+
+    def make_writer(self):
+        return SubmissionWriter(
+            interval_ms=10, max_rows=100, max_queue=1000,
+            max_attempts=3, backoff=0, dead_letter_path=self.dead_letter,
+        )
+
+    def dead_letter_records(self):
+        with open(self.dead_letter, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_bad_row_does_not_block_others(self):
+        async def scenario():
+            writer = self.make_writer()
+            writer.enqueue(1, "first chat")
+            writer.enqueue(1, BAD_TEXT)
+            writer.enqueue(2, "second chat")
+            await writer.flush()
+            writer.enqueue(3, "saved after the failure")
+            await writer.flush()
+            return writer
+
+        writer = asyncio.run(scenario())
+        saved = [row[1] for row in self.db.rows]
+        self.assertEqual(saved, ["first chat", "second chat", "saved after the failure"])
+        self.assertEqual(writer.stats()["queue_depth"], 0)
+        self.assertEqual(writer.stats()["retry_depth"], 1)
+
+    def test_bad_row_is_dead_lettered_after_max_attempts(self):
+        async def scenario():
+            writer = self.make_writer()
+            writer.enqueue(1, BAD_TEXT)
+            for _ in range(5):
+                await writer.flush()
+            return writer
+
+        writer = asyncio.run(scenario())
+        self.assertEqual(writer.stats()["retry_depth"], 0)
+        self.assertEqual(writer.dead_lettered, 1)
+        records = self.dead_letter_records()
+        self.assertEqual([(r["user_id"], r["input_text"], r["attempts"]) for r in records], [(1, BAD_TEXT, 3)])
+
+    def test_stop_dead_letters_instead_of_dropping(self):
+        async def scenario():
+            writer = self.make_writer()
+            writer.start()
+            writer.enqueue(1, BAD_TEXT)
+            writer.enqueue(1, "good chat")
+            await writer.stop()
+            return writer
+
+        asyncio.run(scenario())
+        self.assertEqual([row[1] for row in self.db.rows], ["good chat"])
+        self.assertEqual([r["input_text"] for r in self.dead_letter_records()], [BAD_TEXT])
+
+    def test_insert_sets_required_columns(self):
+        self.assertIn("content_hash", repository.INSERT_SUBMISSION)
+        self.assertIn("input_type", repository.INSERT_SUBMISSION)
+        async def scenario():
+            writer = self.make_writer()
+            writer.enqueue(1, "same text")
+            writer.enqueue(2, "same text")
+            await writer.flush()
+
+        asyncio.run(scenario())
+        hashes = [row[2] for row in self.db.rows]
+        self.assertEqual(len(set(hashes)), 2)
+        self.assertTrue(all(len(h) == 64 for h in hashes))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+# backend/workers.py
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Workers start after the lifespan hook has started gRPC, onnxruntime and httpx
+# threads, and forking a multithreaded process can deadlock in the child; start
+# them from a clean forkserver process (spawn where forkserver is unavailable).
+CPU_POOL_START_METHOD = os.getenv(
+    "CPU_POOL_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn",
+)
+
+
+class PoolBusy(Exception):
+    pass
+
+
+# --- Process pool for CPU-bound work (OCR, opt-in HTML parsing) ---
+# At most workers + max_queue jobs are handed to the executor. Jobs beyond that
+# wait on the event loop for up to queue_timeout seconds and are then rejected
+# with PoolBusy, so neither queue grows without bound.
+class ProcessPool:
+    def __init__(self, workers, max_queue, queue_timeout):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(workers + max_queue) if workers else None
+        self._executor = None
+
+    @property
+    def enabled(self):
+        return self._executor is not None
+
+    def start(self):
+        if self.workers and self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context(CPU_POOL_START_METHOD)
+            )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn, *args):
+        if self._executor is None:
+            return await asyncio.to_thread(fn, *args)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise PoolBusy("CPU worker queue is full.")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+cpu_pool = ProcessPool(
+    workers=int(os.getenv("CPU_POOL_WORKERS", str(os.cpu_count() or 1))),
+    max_queue=int(os.getenv("CPU_POOL_MAX_QUEUE", "64")),
+    queue_timeout=float(os.getenv("CPU_POOL_QUEUE_TIMEOUT", "5")),
+)